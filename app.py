@@ -1,36 +1,143 @@
-# pip install flask requests geopy folium flask-cors bcryptjs pymongo python-dotenv
+# pip install flask requests geopy flask-cors bcryptjs pymongo python-dotenv
 
-from flask import Flask, render_template, request, url_for, jsonify
+from flask import Flask, render_template, request, url_for, jsonify, Response, send_file, stream_with_context
 from flask_cors import CORS
 import requests
 from geopy.distance import geodesic
-import folium
 import os
 import uuid
+import hashlib
 import bcrypt
 import json
+import atexit
+import threading
+import time
+import math
+import numpy as np
 from datetime import datetime
 from pymongo import MongoClient
+from bson import ObjectId
+from bson.errors import InvalidId
 from dotenv import load_dotenv
 import concurrent.futures
+import itertools
+from providers import ProviderClient
+from cache import make_cache, cache_stats
+from geo import geohash_encode, RouteSampler, encode_polyline, decode_polyline, simplify_line, simplify_levels
+from gazetteer import Gazetteer, normalize_name
+from ml_model import recommender
+from persistence import WriteBehindQueue
+from singleflight import SingleFlight, singleflight_stats
+from snapshots import SnapshotRefresher, IncompleteBuild
+from sampling import SamplingPlan
+from aqi_field import AQIField
+from exposure import route_exposure
+from reports import HISTORY_EXPORT_PROJECTION, iter_history_csv, build_history_pdf, ReportJobs
 
 # Load environment variables
 load_dotenv()
 
 # Global ThreadPoolExecutor for background tasks and parallel API calls
-executor = concurrent.futures.ThreadPoolExecutor(max_workers=20)
+EXECUTOR_WORKERS = int(os.getenv("EXECUTOR_WORKERS", 20))
+executor = concurrent.futures.ThreadPoolExecutor(max_workers=EXECUTOR_WORKERS)
 
-# ML initialization is now lazy-loaded inside get_multiple_routes to save memory on Render
-ML_ENABLED = os.path.exists("route_model.json")
+# Separate pool for pipeline stages that themselves fan out to `executor`,
+# so a stage waiting on its own upstream calls can never starve the leaf pool
+task_executor = concurrent.futures.ThreadPoolExecutor(max_workers=EXECUTOR_WORKERS)
+
+# Wall-clock budget for the whole route pipeline (routing + AQI/traffic enrichment)
+ROUTE_DEADLINE_SECONDS = float(os.getenv("ROUTE_DEADLINE_SECONDS", 25))
+# Enrichment samples are sized to what the provider rate limits can serve within
+# this many seconds, so a busy provider means sparser sampling rather than slow responses
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", 2))
+# Identical route queries within the same bucket (seconds) are treated as one
+ROUTE_TIME_BUCKET = int(os.getenv("ROUTE_TIME_BUCKET", 300))
+
+# ML scoring uses the compiled NumPy model from the registry (no xgboost at serve time).
+# The model loads in the background per worker and is never trained inside a request.
+ML_ENABLED = os.getenv("ML_ENABLED", "1") == "1"
+if ML_ENABLED:
+    recommender.registry.start()
 
 app = Flask(__name__)
 CORS(app, origins=["https://breathway-lime.vercel.app", "http://localhost:5173"]) # Allow Vercel and local dev
 
-# MongoDB connection helper for fork-safety
+# MongoDB: one pooled client per process. MongoClient is not fork-safe, so it is
+# created lazily in each gunicorn worker (and recreated if the pid changes).
+_mongo_client = None
+_mongo_pid = None
+_mongo_lock = threading.Lock()
+
+def get_mongo_client():
+    global _mongo_client, _mongo_pid
+    pid = os.getpid()
+    if _mongo_client is None or _mongo_pid != pid:
+        with _mongo_lock:
+            if _mongo_client is None or _mongo_pid != pid:
+                uri = os.getenv("MONGODB_URI", "mongodb://localhost:27017/")
+                _mongo_client = MongoClient(
+                    uri,
+                    maxPoolSize=int(os.getenv("MONGO_MAX_POOL_SIZE", 50)),
+                    minPoolSize=int(os.getenv("MONGO_MIN_POOL_SIZE", 1)),
+                    maxIdleTimeMS=int(os.getenv("MONGO_MAX_IDLE_MS", 300000)),
+                    serverSelectionTimeoutMS=int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000)),
+                    connect=False
+                )
+                _mongo_pid = pid
+                # Build indexes once per process, off the request path
+                executor.submit(ensure_indexes, _mongo_client.breathway)
+    return _mongo_client
+
+def ensure_indexes(db):
+    """Create the indexes used by login and history queries (no-op if they already exist)"""
+    try:
+        db.users.create_index("email", unique=True, name="email_unique")
+        db.routes.create_index([("user_email", 1), ("created_at", -1), ("_id", -1)], name="user_email_created_at_id")
+    except Exception as e:
+        print(f"Index creation failed: {e}")
+
 def get_db():
-    uri = os.getenv("MONGODB_URI", "mongodb://localhost:27017/")
-    client = MongoClient(uri)
-    return client.breathway
+    return get_mongo_client().breathway
+
+# Route history is written behind the response: records are batched into insert_many
+route_write_queue = WriteBehindQueue(
+    "route_history",
+    lambda records: get_db().routes.insert_many(records, ordered=False),
+    maxsize=int(os.getenv("ROUTE_WRITE_QUEUE_SIZE", 1000)),
+    batch_size=int(os.getenv("ROUTE_WRITE_BATCH_SIZE", 50)),
+    flush_interval=float(os.getenv("ROUTE_WRITE_FLUSH_INTERVAL", 1.0))
+)
+atexit.register(route_write_queue.flush)
+
+# Stored route geometry is an encoded polyline instead of a [lon, lat] array,
+# optionally simplified first (tolerance in meters, 0 keeps every vertex)
+GEOMETRY_PRECISION = 5
+HISTORY_GEOMETRY_TOLERANCE_M = float(os.getenv("HISTORY_GEOMETRY_TOLERANCE_M", 0))
+
+def compact_geometry(geometry):
+    """Storage fields for a route geometry"""
+    if HISTORY_GEOMETRY_TOLERANCE_M > 0:
+        geometry = simplify_line(geometry, HISTORY_GEOMETRY_TOLERANCE_M)
+    return {
+        "geometry_polyline": encode_polyline(geometry, GEOMETRY_PRECISION),
+        "geometry_precision": GEOMETRY_PRECISION,
+        "geometry_points": len(geometry)
+    }
+
+# Level of detail for /api/route: routes are returned simplified to ROUTE_GEOMETRY_TOLERANCE_M,
+# and every level in GEOMETRY_LOD_TOLERANCES_M (plus full resolution, tolerance 0) can be
+# fetched by geometry_id while it stays in the route geometry cache
+ROUTE_GEOMETRY_TOLERANCE_M = float(os.getenv("ROUTE_GEOMETRY_TOLERANCE_M", 50))
+GEOMETRY_LOD_TOLERANCES_M = sorted(
+    {float(t) for t in os.getenv("GEOMETRY_LOD_TOLERANCES_M", "1000,200,50").split(",")} | {ROUTE_GEOMETRY_TOLERANCE_M, 0.0},
+    reverse=True
+)
+
+def expand_geometry(route):
+    """Decode a stored route's geometry in place (documents written before compaction are left as is)"""
+    if "geometry_polyline" in route:
+        route["geometry"] = decode_polyline(route.pop("geometry_polyline"), route.pop("geometry_precision", GEOMETRY_PRECISION))
+    return route
 
 # Collections are now accessed via get_db() inside routes
 
@@ -51,19 +158,178 @@ pollution_forecast_url = "https://api.openweathermap.org/data/2.5/air_pollution/
 ors_url = "https://api.openrouteservice.org/v2/directions/"
 tomtom_traffic_url = "https://api.tomtom.com/traffic/services/4/flowSegmentData/absolute/10/json"
 
+# Pooled keep-alive clients, sized so every executor thread can hold a warm connection.
+# Rate limits (requests/second, burst) and daily quotas default to the free tiers
+# (OWM 60/min, ORS 40/min and 2000/day, TomTom 5/s and 2500/day); 0 disables a limit.
+# Limits are enforced per process, so those account-wide defaults are split across the
+# WEB_CONCURRENCY worker processes; explicit *_RATE_LIMIT/*_BURST/*_DAILY_QUOTA values
+# are per process.
+# After BREAKER_FAILURES consecutive failures a provider is skipped for BREAKER_RESET_SECONDS.
+WEB_CONCURRENCY = max(1, int(os.getenv("WEB_CONCURRENCY", 1)))
+
+def per_worker_limit(name, account_limit):
+    """Per-process share of an account-wide limit, unless set explicitly in the environment"""
+    value = os.getenv(name)
+    return float(value) if value is not None else account_limit / WEB_CONCURRENCY
+
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", 5))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", 30))
+owm_client = ProviderClient(
+    "openweathermap", pool_size=EXECUTOR_WORKERS, timeout=float(os.getenv("OWM_TIMEOUT", 5)),
+    rate=per_worker_limit("OWM_RATE_LIMIT", 1),
+    burst=max(1, int(per_worker_limit("OWM_BURST", 60))),
+    daily_quota=int(per_worker_limit("OWM_DAILY_QUOTA", 30000)),
+    failure_threshold=BREAKER_FAILURES, reset_timeout=BREAKER_RESET_SECONDS
+)
+ors_client = ProviderClient(
+    "openrouteservice", pool_size=EXECUTOR_WORKERS, timeout=float(os.getenv("ORS_TIMEOUT", 15)),
+    rate=per_worker_limit("ORS_RATE_LIMIT", 40 / 60),
+    burst=max(1, int(per_worker_limit("ORS_BURST", 40))),
+    daily_quota=int(per_worker_limit("ORS_DAILY_QUOTA", 2000)),
+    failure_threshold=BREAKER_FAILURES, reset_timeout=BREAKER_RESET_SECONDS
+)
+tomtom_client = ProviderClient(
+    "tomtom", pool_size=EXECUTOR_WORKERS, timeout=float(os.getenv("TOMTOM_TIMEOUT", 5)),
+    rate=per_worker_limit("TOMTOM_RATE_LIMIT", 5),
+    burst=max(1, int(per_worker_limit("TOMTOM_BURST", 5))),
+    daily_quota=int(per_worker_limit("TOMTOM_DAILY_QUOTA", 2500)),
+    failure_threshold=BREAKER_FAILURES, reset_timeout=BREAKER_RESET_SECONDS
+)
+PROVIDER_CLIENTS = [owm_client, ors_client, tomtom_client]
+
+# AQI tile cache: OWM air pollution data is coarse in space and hourly in time,
+# so nearby points within the same time bucket share one upstream lookup
+AQI_GEOHASH_PRECISION = int(os.getenv("AQI_GEOHASH_PRECISION", 5))  # ~4.9 km cells
+AQI_TIME_BUCKET = int(os.getenv("AQI_TIME_BUCKET", 3600))  # seconds
+# Route sampling: "ellipsoidal" matches geopy geodesic closely, "haversine" is spherical
+ROUTE_SAMPLER_MODE = os.getenv("ROUTE_SAMPLER_MODE", "ellipsoidal")
+AQI_SAMPLE_INTERVAL_KM = float(os.getenv("AQI_SAMPLE_INTERVAL_KM", 10))
+TRAFFIC_SAMPLE_INTERVAL_KM = float(os.getenv("TRAFFIC_SAMPLE_INTERVAL_KM", 20))
+# Traffic points per route scale with length (one per TRAFFIC_SAMPLE_INTERVAL_KM) up to this cap
+TRAFFIC_MAX_POINTS = int(os.getenv("TRAFFIC_MAX_POINTS", 12))
+# Flow readings are cached per road segment, indexed by the geohash cells it passes through
+TRAFFIC_SEGMENT_PRECISION = int(os.getenv("TRAFFIC_SEGMENT_PRECISION", 7))  # ~150 m cells
+TRAFFIC_SEGMENT_MAX_CELLS = 256
+# Grid that traffic sample points from all of a request's routes are deduplicated on
+TRAFFIC_PLAN_PRECISION = int(os.getenv("TRAFFIC_PLAN_PRECISION", 6))  # ~1.2 km cells
+
+# Interpolated AQI field: samples within reach of a fresh enough reading are estimated
+# instead of fetched (confidence falls off as exp(-km / AQI_FIELD_LENGTH_KM), halving
+# every AQI_FIELD_HALF_LIFE seconds of anchor age)
+AQI_FIELD_MIN_CONFIDENCE = float(os.getenv("AQI_FIELD_MIN_CONFIDENCE", 0.5))
+aqi_field = AQIField(
+    length_km=float(os.getenv("AQI_FIELD_LENGTH_KM", 25)),
+    half_life=int(os.getenv("AQI_FIELD_HALF_LIFE", 2 * 3600)),
+    radius_km=float(os.getenv("AQI_FIELD_RADIUS_KM", 75))
+)
+# Anchor the field at every state capital and major city from worker start (via the
+# AQI snapshot builds) instead of only once the dashboard has been opened
+AQI_FIELD_SEED = os.getenv("AQI_FIELD_SEED", "1") == "1"
+
+# Entries outlive their bucket by one more bucket, so the previous bucket's reading
+# can be served (and refreshed in the background) while the current one is missing
+aqi_tile_cache = make_cache(
+    "aqi_tiles",
+    maxsize=int(os.getenv("AQI_CACHE_SIZE", 10000)),
+    ttl=int(os.getenv("AQI_CACHE_TTL", 2 * AQI_TIME_BUCKET))
+)
+
+# Route plans are user-independent: identical queries reuse the result for ROUTE_CACHE_TTL.
+# Expired plans are kept for ROUTE_STALE_TTL more as a fallback for when a fresh plan fails.
+ROUTE_CACHE_SIZE = int(os.getenv("ROUTE_CACHE_SIZE", 256))
+ROUTE_CACHE_TTL = int(os.getenv("ROUTE_CACHE_TTL", ROUTE_TIME_BUCKET))
+ROUTE_STALE_TTL = int(os.getenv("ROUTE_STALE_TTL", 3600))
+route_cache = make_cache(
+    "routes",
+    maxsize=ROUTE_CACHE_SIZE,
+    ttl=ROUTE_CACHE_TTL,
+    stale_ttl=ROUTE_STALE_TTL
+)
+
+# Current weather per coordinate, served stale (and refreshed in the background) if expired
+weather_cache = make_cache(
+    "weather",
+    maxsize=int(os.getenv("WEATHER_CACHE_SIZE", 5000)),
+    ttl=int(os.getenv("WEATHER_CACHE_TTL", 600)),
+    stale_ttl=int(os.getenv("WEATHER_STALE_TTL", 3 * 3600))
+)
+
+# TomTom flow readings per segment cell: fresh for TRAFFIC_CACHE_TTL, then served stale
+# (while a background refresh runs) for up to TRAFFIC_STALE_TTL more
+traffic_cache = make_cache(
+    "traffic",
+    maxsize=int(os.getenv("TRAFFIC_CACHE_SIZE", 20000)),
+    ttl=int(os.getenv("TRAFFIC_CACHE_TTL", 180)),
+    stale_ttl=int(os.getenv("TRAFFIC_STALE_TTL", 1800))
+)
+
+# Precomputed LOD levels of planned route geometries, keyed by geometry_id. Kept well past
+# the route plan's own lifetime so clients can still fetch detail for a plan they hold:
+# never shorter than a plan may be served (stale included), and room for every route of
+# every cached plan. Levels evicted anyway are rebuilt when the plan is served again.
+route_geometry_cache = make_cache(
+    "route_geometries",
+    maxsize=max(int(os.getenv("ROUTE_GEOMETRY_CACHE_SIZE", 1024)), 3 * ROUTE_CACHE_SIZE),
+    ttl=max(int(os.getenv("ROUTE_GEOMETRY_TTL", 6 * 3600)), ROUTE_CACHE_TTL + ROUTE_STALE_TTL)
+)
+
+# Remote geocodes, so every worker benefits from a lookup made by any of them
+geocode_cache = make_cache(
+    "geocodes",
+    maxsize=int(os.getenv("GEOCODE_CACHE_SIZE", 5000)),
+    ttl=int(os.getenv("GEOCODE_CACHE_TTL", 7 * 24 * 3600))
+)
+
+# Concurrent identical lookups share one in-flight upstream call
+route_flight = SingleFlight("route")
+aqi_flight = SingleFlight("aqi_tile")
+traffic_flight = SingleFlight("traffic_point")
+weather_flight = SingleFlight("weather")
+geocode_flight = SingleFlight("geocode")
+
+# Offline gazetteer: bundled cities file, seeded further from STATE_CAPITALS and
+# MAJOR_CITIES below, plus write-through of every successful remote geocode
+CITIES_FILE = os.getenv("CITIES_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cities.json"))
+gazetteer = Gazetteer()
+gazetteer.load_file(CITIES_FILE)
+# Write-through entries come from free-text queries, so they never replace curated
+# entries and are capped per process
+GAZETTEER_MAX_REMOTE_ADDS = int(os.getenv("GAZETTEER_MAX_REMOTE_ADDS", 2000))
+_gazetteer_remote_adds = itertools.count()
+
 # ----------------- FUNCTIONS -----------------
 def find_city(city_name):
+    city_info = gazetteer.lookup(city_name)
+    if city_info:
+        return city_info
+    return geocode_flight.do(normalize_name(city_name), geocode_city, city_name)
+
+def geocode_city(city_name):
+    """Remote OWM geocode (through the shared geocode cache), written through to the gazetteer"""
     try:
-        url = f"{geocode_url}q={city_name}&limit=1&appid={weather_api_key}"
-        res = requests.get(url)
-        data = res.json()
-        if len(data) == 0:
-            return None
+        key = normalize_name(city_name)
+        match = geocode_cache.get(key)
+        if match is None:
+            url = f"{geocode_url}q={city_name}&limit=1&appid={weather_api_key}"
+            res = owm_client.get(url)
+            data = res.json()
+            if len(data) == 0:
+                return None
+            match = data[0]
+            geocode_cache.set(key, match)
+        if next(_gazetteer_remote_adds) < GAZETTEER_MAX_REMOTE_ADDS:
+            gazetteer.add(
+                match["name"], match["lat"], match["lon"],
+                country=match["country"],
+                state=match.get("state"),
+                aliases=[city_name],
+                overwrite=False
+            )
         return {
-            "name": data[0]["name"],
-            "lat": data[0]["lat"],
-            "lon": data[0]["lon"],
-            "country": data[0]["country"]
+            "name": match["name"],
+            "lat": match["lat"],
+            "lon": match["lon"],
+            "country": match["country"]
         }
     except requests.RequestException as e:
         print("Geocoding error:", e)
@@ -110,25 +376,75 @@ def convert_aqi_to_raw(aqi_index, components=None):
     base_map = {1: 35, 2: 75, 3: 150, 4: 250, 5: 350}
     return base_map.get(aqi_index, 25)
 
+def aqi_tile_key(lat, lon, buckets_ago=0):
+    """Cache key for the AQI tile containing a coordinate in the current (or an earlier) time bucket"""
+    bucket = int(datetime.now().timestamp() // AQI_TIME_BUCKET) - buckets_ago
+    return (geohash_encode(lat, lon, AQI_GEOHASH_PRECISION), bucket)
+
+def aqi_tile_cached(lat, lon):
+    """True if fetch_pollution can answer from the tile cache (current or previous bucket)"""
+    return aqi_tile_cache.contains(aqi_tile_key(lat, lon)) or aqi_tile_cache.contains(aqi_tile_key(lat, lon, buckets_ago=1))
+
+def revalidate_in_background(flight, key, fn, *args):
+    """Refresh a stale entry off the request path, at most one refresh per key at a time"""
+    if not flight.in_flight(key):
+        executor.submit(flight.do, key, fn, *args)
+
+def fetch_pollution(lat, lon, deadline=None):
+    """
+    Get the current OWM air pollution entry ({"main": {"aqi"}, "components"}) for a coordinate.
+    Served from the AQI tile cache when possible; raises requests.RequestException on network
+    errors (including RateLimited when no request budget is left before the deadline).
+    """
+    key = aqi_tile_key(lat, lon)
+    entry = aqi_tile_cache.get(key)
+    if entry is not None:
+        return entry
+    
+    # Stale-while-revalidate: answer with the previous bucket's reading if we have one
+    stale = aqi_tile_cache.get(aqi_tile_key(lat, lon, buckets_ago=1))
+    if stale is not None:
+        revalidate_in_background(aqi_flight, key, fetch_pollution_tile, key, lat, lon)
+        return stale
+    return aqi_flight.do(key, fetch_pollution_tile, key, lat, lon, deadline)
+
+def fetch_pollution_tile(key, lat, lon, deadline=None):
+    entry = aqi_tile_cache.get(key)
+    if entry is not None:
+        return entry
+
+    res = owm_client.get(f"{pollution_url}lat={lat}&lon={lon}&appid={weather_api_key}", deadline=deadline)
+    data = res.json()
+    if "list" not in data or len(data["list"]) == 0:
+        return None
+
+    entry = data["list"][0]
+    aqi_tile_cache.set(key, entry)
+    return entry
+
 def get_weather(city):
     city_info = find_city(city)
     if not city_info:
         return None
     lat, lon = city_info["lat"], city_info["lon"]
 
+    # Weather and pollution only depend on the geocode, so fetch them in parallel
+    pollution_future = executor.submit(fetch_pollution, lat, lon)
+
     # Get weather in Celsius
     try:
-        w_res = requests.get(f"{weather_url}lat={lat}&lon={lon}&units=metric&appid={weather_api_key}")
-        w_data = w_res.json()
-        if w_data.get("cod") != 200:
+        w_data = fetch_current_weather(lat, lon)
+        if w_data is None:
             return None
 
-        p_res = requests.get(f"{pollution_url}lat={lat}&lon={lon}&appid={weather_api_key}")
-        p_data = p_res.json()
+        pollution = pollution_future.result()
+        if pollution is None:
+            return None
         
-        raw_aqi_index = p_data["list"][0]["main"]["aqi"]
-        components = p_data["list"][0].get("components")
+        raw_aqi_index = pollution["main"]["aqi"]
+        components = pollution.get("components")
         aqi = convert_aqi_to_raw(raw_aqi_index, components)
+        aqi_field.observe(lat, lon, aqi, pollution.get("dt"))
 
         return {
             "city": city_info["name"],
@@ -150,11 +466,30 @@ def get_weather(city):
         print("Weather/Pollution error:", e)
         return None
 
+def fetch_current_weather(lat, lon):
+    """Current OWM weather for a coordinate, from the weather cache when possible"""
+    key = (round(lat, 3), round(lon, 3))
+    w_data, fresh = weather_cache.get_stale(key)
+    if fresh:
+        return w_data
+    if w_data is not None:
+        revalidate_in_background(weather_flight, key, fetch_current_weather_remote, key, lat, lon)
+        return w_data
+    return weather_flight.do(key, fetch_current_weather_remote, key, lat, lon)
+
+def fetch_current_weather_remote(key, lat, lon):
+    res = owm_client.get(f"{weather_url}lat={lat}&lon={lon}&units=metric&appid={weather_api_key}")
+    w_data = res.json()
+    if w_data.get("cod") != 200:
+        return None
+    weather_cache.set(key, w_data)
+    return w_data
+
 def get_weather_forecast(lat, lon):
     """Get 5-day weather forecast"""
     try:
         url = f"{weather_forecast_url}lat={lat}&lon={lon}&units=metric&appid={weather_api_key}"
-        res = requests.get(url)
+        res = owm_client.get(url)
         data = res.json()
         # OWM returns string "200" for success in forecast api, unlike int 200 in weather
         if str(data.get("cod")) != "200":
@@ -168,7 +503,7 @@ def get_aqi_forecast(lat, lon):
     """Get AQI forecast"""
     try:
         url = f"{pollution_forecast_url}lat={lat}&lon={lon}&appid={weather_api_key}"
-        res = requests.get(url)
+        res = owm_client.get(url)
         return res.json().get("list", [])
     except Exception as e:
         print("AQI forecast error:", e)
@@ -236,7 +571,7 @@ def process_forecast_data(weather_list, aqi_list):
         
     return sorted(forecast, key=lambda x: x["date"])[:5]
 
-def get_route(src, dest, mode="driving-car", alternatives=True, preference="recommended"):
+def get_route(src, dest, mode="driving-car", alternatives=True, preference="recommended", deadline=None):
     """
     Get route(s) from ORS API
     If alternatives=True, requests up to 3 alternative routes
@@ -261,7 +596,7 @@ def get_route(src, dest, mode="driving-car", alternatives=True, preference="reco
         }
     
     try:
-        res = requests.post(ors_url + mode + "/geojson", json=body, headers=headers)
+        res = ors_client.post(ors_url + mode + "/geojson", json=body, headers=headers, deadline=deadline)
         data = res.json()
         
         # Check for errors
@@ -281,7 +616,8 @@ def get_route(src, dest, mode="driving-car", alternatives=True, preference="reco
                 routes.append({
                     "distance": round(summary["distance"] / 1000, 2),
                     "duration": round(summary["duration"] / 60, 1),
-                    "geometry": geometry
+                    "geometry": geometry,
+                    "steps": route_steps(feature["properties"])
                 })
             return routes if len(routes) > 0 else None
         else:
@@ -291,7 +627,8 @@ def get_route(src, dest, mode="driving-car", alternatives=True, preference="reco
             return {
                 "distance": round(summary["distance"] / 1000, 2),
                 "duration": round(summary["duration"] / 60, 1),
-                "geometry": geometry
+                "geometry": geometry,
+                "steps": route_steps(data["features"][0]["properties"])
             }
     except Exception as e:
         print("Route Error:", e)
@@ -299,91 +636,77 @@ def get_route(src, dest, mode="driving-car", alternatives=True, preference="reco
         traceback.print_exc()
         return None
 
-def sample_route_points(geometry, interval_km=5):
-    """Sample points along route at specified intervals (in km)"""
-    from geopy.distance import geodesic
-    
-    if not geometry or len(geometry) < 2:
-        return []
-    
-    sampled_points = []
-    total_distance = 0
-    last_sampled_distance = 0
-    
-    # Always include first point
-    sampled_points.append({
-        "lat": geometry[0][1],
-        "lon": geometry[0][0],
-        "distance": 0
-    })
-    
-    for i in range(1, len(geometry)):
-        prev_point = (geometry[i-1][1], geometry[i-1][0])  # (lat, lon)
-        curr_point = (geometry[i][1], geometry[i][0])
-        
-        segment_distance = geodesic(prev_point, curr_point).km
-        total_distance += segment_distance
-        
-        # Sample if we've traveled enough distance
-        if total_distance - last_sampled_distance >= interval_km:
-            sampled_points.append({
-                "lat": geometry[i][1],
-                "lon": geometry[i][0],
-                "distance": round(total_distance, 2)
-            })
-            last_sampled_distance = total_distance
-    
-    # Always include last point
-    if len(geometry) > 1:
-        sampled_points.append({
-            "lat": geometry[-1][1],
-            "lon": geometry[-1][0],
-            "distance": round(total_distance, 2)
-        })
-    
-    return sampled_points
+def route_steps(properties):
+    """ORS step durations (seconds) and vertex ranges, used to time-weight AQI along the geometry"""
+    return [
+        {"duration": step["duration"], "way_points": step["way_points"]}
+        for segment in properties.get("segments", [])
+        for step in segment.get("steps", [])
+    ]
 
-def get_aqi_for_point(lat, lon):
+def get_aqi_for_point(lat, lon, deadline=None):
     """Get AQI data for a specific coordinate"""
     try:
-        res = requests.get(f"{pollution_url}lat={lat}&lon={lon}&appid={weather_api_key}")
-        data = res.json()
-        if "list" in data and len(data["list"]) > 0:
-            raw_index = data["list"][0]["main"]["aqi"]
-            components = data["list"][0].get("components")
-            return convert_aqi_to_raw(raw_index, components)
+        pollution = fetch_pollution(lat, lon, deadline)
+        if pollution is not None:
+            raw_index = pollution["main"]["aqi"]
+            components = pollution.get("components")
+            aqi = convert_aqi_to_raw(raw_index, components)
+            # Cached and stale tiles feed the field too, not just upstream fetches
+            aqi_field.observe(lat, lon, aqi, pollution.get("dt"))
+            return aqi
         return None
     except Exception as e:
         print(f"AQI fetch error for ({lat}, {lon}):", e)
         return None
 
-def calculate_route_aqi(geometry, src_aqi, dest_aqi):
-    """Calculate weighted average AQI along entire route using parallel point sampling"""
-    sampled_points = sample_route_points(geometry, interval_km=10)
-    
-    if len(sampled_points) <= 2:
-        return round((src_aqi + dest_aqi) / 2)
-    
-    # We already have start and end AQIs
-    middle_points = sampled_points[1:-1]
+def remaining_time(deadline):
+    """Seconds left before a time.monotonic() deadline (None means no deadline)"""
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+def estimate_sample_aqi(routes_points, budget=math.inf, deadline=None):
+    """
+    AQI at each route's sample points, evaluated on the interpolated AQI field
+    (None where it has no estimate). Only points the field cannot estimate confidently
+    are looked up live (deduplicated across routes and limited to budget); each reading
+    becomes an anchor, so the final pass over all points also fills the gaps around it.
+    """
+    if AQI_FIELD_SEED:
+        aqi_snapshots.start()  # no-op unless this is a freshly forked worker
+    points = [p for route_points in routes_points for p in route_points]
+    lats = np.array([p["lat"] for p in points])
+    lons = np.array([p["lon"] for p in points])
     
-    # Use global executor
-    future_to_point = {executor.submit(get_aqi_for_point, p["lat"], p["lon"]): p for p in middle_points}
+    plan = SamplingPlan("AQI", AQI_GEOHASH_PRECISION)
+    picked = set(aqi_field.gaps(lats, lons, AQI_FIELD_MIN_CONFIDENCE))
+    offset = 0
+    for route_points in routes_points:
+        plan.add_route([p for i, p in enumerate(route_points, offset) if i in picked])
+        offset += len(route_points)
+    plan.fetch(get_aqi_for_point, executor, budget, deadline, cached=aqi_tile_cached)
     
-    aqi_values = [src_aqi]
-    for future in concurrent.futures.as_completed(future_to_point):
-        try:
-            aqi = future.result()
-            if aqi is not None:
-                aqi_values.append(aqi)
-        except Exception as e:
-            print(f"Error in parallel AQI fetch: {e}")
-                
-    aqi_values.append(dest_aqi)
-    
-    if aqi_values:
-        return round(sum(aqi_values) / len(aqi_values))
-    return round((src_aqi + dest_aqi) / 2)
+    estimates, _ = aqi_field.estimate(lats, lons)
+    print(f"AQI field: {len(points)} samples, {len(picked)} gaps, plan {plan.stats()}")
+    route_values = []
+    offset = 0
+    for route_points in routes_points:
+        values = estimates[offset:offset + len(route_points)]
+        route_values.append([None if np.isnan(v) else float(v) for v in values])
+        offset += len(route_points)
+    return route_values
+
+def calculate_route_exposure(sampler, sampled_points, aqi_values, src_aqi, dest_aqi, steps=None, duration_min=None, delay_factor=1.0):
+    """
+    Exposure metrics (exposure.route_exposure) for a route given AQI at its intermediate
+    sample points (None where unknown) and the endpoint AQIs. delay_factor scales the
+    step durations to the traffic-adjusted ETA.
+    """
+    known = [(p["distance"], aqi) for p, aqi in zip(sampled_points, aqi_values) if aqi is not None]
+    sample_km = [0.0] + [d for d, _ in known] + [sampler.total_km]
+    sample_aqi = [src_aqi] + [aqi for _, aqi in known] + [dest_aqi]
+    return route_exposure(sampler.cumulative, sample_km, sample_aqi, steps, duration_min, delay_factor)
 
 def calculate_route_score(distance, duration, aqi, optimization="balanced"):
     """
@@ -404,18 +727,77 @@ def calculate_route_score(distance, duration, aqi, optimization="balanced"):
         # Equal weights
         return (duration * 0.33) + (distance * 0.33) + (norm_aqi * 0.34)
 
+def get_detour_route(src, dest, mode, detour_point, deadline=None):
+    """Get a single fastest route from src to dest forced through detour_point"""
+    headers = {"Authorization": ors_api_key, "Content-Type": "application/json"}
+    body = {
+        "coordinates": [
+            [src["lon"], src["lat"]],
+            [detour_point["lon"], detour_point["lat"]],
+            [dest["lon"], dest["lat"]]
+        ],
+        "preference": "fastest" # Use fastest to get good roads even on detour
+    }
+    
+    try:
+        res = ors_client.post(ors_url + mode + "/geojson", json=body, headers=headers, deadline=deadline)
+        data = res.json()
+        
+        if "features" in data and len(data["features"]) > 0:
+            summary = data["features"][0]["properties"]["summary"]
+            geometry = data["features"][0]["geometry"]["coordinates"]
+            
+            return {
+                "distance": round(summary["distance"] / 1000, 2),
+                "duration": round(summary["duration"] / 60, 1),
+                "geometry": geometry,
+                "steps": route_steps(data["features"][0]["properties"])
+            }
+    except Exception as e:
+        print(f"Detour generation failed: {e}")
+    return None
+
+def get_detour_points(src, dest):
+    """Candidate detour waypoints: the midpoint shifted by ~15-20km in different directions"""
+    mid_lat = (src["lat"] + dest["lat"]) / 2
+    mid_lon = (src["lon"] + dest["lon"]) / 2
+    
+    # Offset by ~20km (approx 0.2 deg) to force a different path
+    offsets = [(0.15, 0.15), (-0.15, -0.15), (0.15, -0.15)]
+    return [{"lat": mid_lat + lat_offset, "lon": mid_lon + lon_offset} for lat_offset, lon_offset in offsets]
+
 def get_multiple_routes(src, dest, mode="driving-car", include_traffic=True):
     """
     Get multiple different route paths using ORS alternative routes API AND varying preferences.
     Simulates A* with different cost functions (Fastest weighting vs Shortest weighting).
+    All upstream calls are issued concurrently and bounded by ROUTE_DEADLINE_SECONDS.
     """
-    # Strategy 1: "Fastest" preference (Standard A* with time heuristic)
-    print(f"Strategy 1: Requesting 'Fastest' routes from {src['city']} to {dest['city']}...")
-    fastest_routes = get_route(src, dest, mode, alternatives=True, preference="fastest") or []
+    deadline = time.monotonic() + ROUTE_DEADLINE_SECONDS
     
+    # Strategy 1: "Fastest" preference (Standard A* with time heuristic)
     # Strategy 2: "Shortest" preference (A* with distance heuristic) - often completely different path
-    print(f"Strategy 2: Requesting 'Shortest' route...")
-    shortest_route = get_route(src, dest, mode, alternatives=False, preference="shortest")
+    print(f"Strategies 1+2: Requesting 'Fastest' and 'Shortest' routes from {src['city']} to {dest['city']}...")
+    fastest_future = executor.submit(get_route, src, dest, mode, True, "fastest", deadline)
+    shortest_future = executor.submit(get_route, src, dest, mode, False, "shortest", deadline)
+    
+    try:
+        fastest_routes = fastest_future.result(timeout=remaining_time(deadline)) or []
+    except Exception as e:
+        print(f"Fastest route request failed: {e}")
+        fastest_routes = []
+    
+    # Strategy 3: Forced Detour. Only needed when 'fastest' gave fewer than 2 routes;
+    # start the candidates now so they overlap with the pending 'shortest' request
+    detour_futures = []
+    if len(fastest_routes) < 2:
+        print("Strategy 3: Requesting forced detour candidates in parallel...")
+        detour_futures = [executor.submit(get_detour_route, src, dest, mode, point, deadline) for point in get_detour_points(src, dest)]
+    
+    try:
+        shortest_route = shortest_future.result(timeout=remaining_time(deadline))
+    except Exception as e:
+        print(f"Shortest route request failed: {e}")
+        shortest_route = None
     
     raw_routes = []
     
@@ -441,59 +823,21 @@ def get_multiple_routes(src, dest, mode="driving-car", include_traffic=True):
         else:
             print("Shortest route is duplicate, skipping.")
 
-    # Strategy 3: Forced Detour (if we still don't have enough distinct routes)
-    # This ensures "Real Data" difference by forcing a path through a different coordinate
-    if len(raw_routes) < 2:
-        print("Strategy 3: Routes are identical. Generating a forced detour to ensure variety...")
-        
-        # Calculate a detour point (midpoint + offset)
-        mid_lat = (src["lat"] + dest["lat"]) / 2
-        mid_lon = (src["lon"] + dest["lon"]) / 2
-        
-        # Offset by ~20km (approx 0.2 deg) to force a different path
-        # Try two different offsets to find a valid route
-        offsets = [(0.15, 0.15), (-0.15, -0.15), (0.15, -0.15)]
-        
-        for lat_offset, lon_offset in offsets:
-            detour_point = {
-                "lat": mid_lat + lat_offset, 
-                "lon": mid_lon + lon_offset
-            }
-            
-            # Construct body manually for waypoint request
-            headers = {"Authorization": ors_api_key, "Content-Type": "application/json"}
-            body = {
-                "coordinates": [
-                    [src["lon"], src["lat"]],
-                    [detour_point["lon"], detour_point["lat"]],
-                    [dest["lon"], dest["lat"]]
-                ],
-                "preference": "fastest" # Use fastest to get good roads even on detour
-            }
-            
-            try:
-                res = requests.post(ors_url + mode + "/geojson", json=body, headers=headers)
-                data = res.json()
-                
-                if "features" in data and len(data["features"]) > 0:
-                    summary = data["features"][0]["properties"]["summary"]
-                    geometry = data["features"][0]["geometry"]["coordinates"]
-                    
-                    detour_route = {
-                        "distance": round(summary["distance"] / 1000, 2),
-                        "duration": round(summary["duration"] / 60, 1),
-                        "geometry": geometry
-                    }
-                    
-                    # Verify it's not absurdly long (e.g. > 2x original) to be a valid alternative
-                    base_dist = raw_routes[0]["distance"]
-                    if detour_route["distance"] < base_dist * 2.0:
-                        print(f"Detour route found via offset ({lat_offset}, {lon_offset})")
-                        raw_routes.append(detour_route)
-                        break 
-            except Exception as e:
-                print(f"Detour generation failed: {e}")
-                continue
+    # Take the first acceptable detour to arrive; the rest are cancelled
+    if len(raw_routes) < 2 and raw_routes and detour_futures:
+        base_dist = raw_routes[0]["distance"]
+        try:
+            for future in concurrent.futures.as_completed(detour_futures, timeout=remaining_time(deadline)):
+                detour_route = future.result()
+                # Verify it's not absurdly long (e.g. > 2x original) to be a valid alternative
+                if detour_route and detour_route["distance"] < base_dist * 2.0:
+                    print("Detour route found")
+                    raw_routes.append(detour_route)
+                    break
+        except concurrent.futures.TimeoutError:
+            print("Detour candidates hit deadline")
+    for future in detour_futures:
+        future.cancel()
 
     # Fallback if no routes found
     if not raw_routes:
@@ -502,26 +846,77 @@ def get_multiple_routes(src, dest, mode="driving-car", include_traffic=True):
     
     print(f"Total distinct routes found: {len(raw_routes)}")
     
+    # Enrich all routes with AQI and traffic in parallel under the shared deadline.
+    # Alternatives overlap heavily, so sample points from every route go into one plan
+    # per provider and each grid cell is looked up once for all of them. Cells already
+    # cached (fresh or stale) are always used; cache misses are limited to what the
+    # provider rate limits can serve shortly, so under load (or while a circuit breaker
+    # is open) routes are sampled more sparsely instead of failing calls.
+    routes_to_enrich = raw_routes[:3]  # Limit to 3 max
+    budget_window = min(remaining_time(deadline), RATE_LIMIT_MAX_WAIT)
+    samplers = []
+    aqi_points = []
+    traffic_plan = SamplingPlan("Traffic", TRAFFIC_PLAN_PRECISION)
+    fetch_traffic = include_traffic and tomtom_api_key
+    
+    for route_data in routes_to_enrich:
+        # One pass over the geometry yields both the AQI and the traffic sample points
+        sampler = RouteSampler(route_data["geometry"], ROUTE_SAMPLER_MODE)
+        samplers.append(sampler)
+        samples = sampler.sample_many([AQI_SAMPLE_INTERVAL_KM, TRAFFIC_SAMPLE_INTERVAL_KM])
+        # The endpoints' AQI is already known
+        aqi_points.append(samples[AQI_SAMPLE_INTERVAL_KM][1:-1])
+        traffic_plan.add_route(samples[TRAFFIC_SAMPLE_INTERVAL_KM])
+    
+    aqi_future = task_executor.submit(
+        estimate_sample_aqi, aqi_points, owm_client.capacity(budget_window), deadline
+    )
+    traffic_future = None
+    if fetch_traffic:
+        traffic_budget = min(
+            tomtom_client.capacity(budget_window),
+            TRAFFIC_MAX_POINTS * len(routes_to_enrich)
+        )
+        traffic_future = task_executor.submit(
+            traffic_plan.fetch, get_traffic_for_point, executor, traffic_budget, deadline, traffic_cached
+        )
+    
+    pending = [f for f in (aqi_future, traffic_future) if f is not None]
+    concurrent.futures.wait(pending, timeout=remaining_time(deadline))
+    if fetch_traffic:
+        print(f"Traffic sampling plan: {traffic_plan.stats()}")
+    
+    sample_aqis = None
+    if aqi_future.done() and aqi_future.exception() is None:
+        sample_aqis = aqi_future.result()
+    else:
+        aqi_future.cancel()
+        print("Route AQI samples unavailable before deadline, interpolating between endpoints")
+    
     # Process routes
     processed_routes = []
     
-    for idx, route_data in enumerate(raw_routes[:3]):  # Limit to 3 max
-        # Calculate comprehensive AQI for this route
-        route_aqi = calculate_route_aqi(route_data["geometry"], src["aqi"], dest["aqi"])
-        
-        # Get traffic data for this route (only for first few to save API calls)
+    for idx, route_data in enumerate(routes_to_enrich):
         traffic_data = None
         traffic_adjusted_duration = route_data["duration"]
         
-        if include_traffic and tomtom_api_key and idx < 2: 
-            print(f"Fetching traffic data for route {idx + 1}...")
-            traffic_data = get_traffic_data(route_data["geometry"])
-            if traffic_data and traffic_data["status"] != "unknown":
+        if fetch_traffic:
+            traffic_data = summarize_traffic(traffic_plan.values(idx))
+            if traffic_data["status"] != "unknown":
                 traffic_adjusted_duration = calculate_traffic_adjusted_eta(
                     route_data["duration"], 
                     traffic_data
                 )
         
+        # Route AQI is the time-weighted mean along the geometry; time spent in traffic counts too
+        delay_factor = traffic_adjusted_duration / route_data["duration"] if route_data["duration"] > 0 else 1.0
+        exposure = calculate_route_exposure(
+            samplers[idx], aqi_points[idx],
+            sample_aqis[idx] if sample_aqis else [None] * len(aqi_points[idx]),
+            src["aqi"], dest["aqi"], route_data.get("steps"), route_data["duration"], delay_factor
+        )
+        route_aqi = exposure["mean_aqi"]
+        
         # Initial type assignment (refined later)
         if idx == 0:
             initial_type = "fastest"
@@ -537,6 +932,7 @@ def get_multiple_routes(src, dest, mode="driving-car", include_traffic=True):
             "duration": route_data["duration"],
             "traffic_adjusted_duration": traffic_adjusted_duration if traffic_data else None,
             "aqi": route_aqi,
+            "exposure": exposure,
             "geometry": route_data["geometry"],
             "traffic": traffic_data,
             "score": 0 # Calculated below
@@ -549,7 +945,8 @@ def get_multiple_routes(src, dest, mode="driving-car", include_traffic=True):
     # Re-calculate indices based on actual data
     if processed_routes:
         fastest_idx = min(range(len(processed_routes)), key=lambda i: processed_routes[i]["traffic_adjusted_duration"] or processed_routes[i]["duration"])
-        cleanest_idx = min(range(len(processed_routes)), key=lambda i: processed_routes[i]["aqi"])
+        # Cleanest means the smallest dose over the trip, not the lowest average
+        cleanest_idx = min(range(len(processed_routes)), key=lambda i: processed_routes[i]["exposure"]["exposure"])
         
         # Reset types
         for r in processed_routes: r["type"] = "balanced"
@@ -573,14 +970,15 @@ def get_multiple_routes(src, dest, mode="driving-car", include_traffic=True):
     # Determine recommended
     recommended_idx = 0
     if processed_routes:
-        cleanest_idx = min(range(len(processed_routes)), key=lambda i: processed_routes[i]["aqi"])
+        cleanest_idx = min(range(len(processed_routes)), key=lambda i: processed_routes[i]["exposure"]["exposure"])
         recommended_idx = cleanest_idx # Default to clean choice
     
-    # Apply ML scoring if enabled
-    if ML_ENABLED and processed_routes:
+    # Apply ML scoring if enabled and a model has finished loading
+    if ML_ENABLED:
+        recommender.registry.start()  # no-op unless this is a freshly forked worker
+    if ML_ENABLED and recommender.ready and processed_routes:
         try:
-            from ml_model import recommender
-            print("Applying ML scoring (on-demand)...")
+            print(f"Applying ML scoring (model {recommender.model_version})...")
             scored_routes, ml_recommended_idx = recommender.get_route_scores(processed_routes)
             recommended_idx = ml_recommended_idx
             processed_routes = scored_routes
@@ -593,8 +991,41 @@ def get_multiple_routes(src, dest, mode="driving-car", include_traffic=True):
         "recommended": recommended_idx
     }
 
-def get_traffic_for_point(lat, lon):
-    """Get traffic data for a specific point using TomTom API"""
+def traffic_cell(lat, lon):
+    """Geohash cell that traffic readings are cached under"""
+    return geohash_encode(lat, lon, TRAFFIC_SEGMENT_PRECISION)
+
+def segment_cells(coordinates):
+    """Cells covered by a TomTom segment polyline, stepping ~100 m between its vertices"""
+    cells = set()
+    for a, b in zip(coordinates, coordinates[1:] or coordinates):
+        steps = max(1, math.ceil(max(abs(b["latitude"] - a["latitude"]), abs(b["longitude"] - a["longitude"])) / 0.001))
+        for i in range(steps + 1):
+            t = i / steps
+            cells.add(traffic_cell(
+                a["latitude"] + (b["latitude"] - a["latitude"]) * t,
+                a["longitude"] + (b["longitude"] - a["longitude"]) * t
+            ))
+            if len(cells) >= TRAFFIC_SEGMENT_MAX_CELLS:
+                return cells
+    return cells
+
+def traffic_cached(lat, lon):
+    """True if get_traffic_for_point can answer from the traffic cache, fresh or stale"""
+    return traffic_cache.contains(traffic_cell(lat, lon), allow_stale=True)
+
+def get_traffic_for_point(lat, lon, deadline=None):
+    """Get traffic data for a specific point using TomTom API (stale readings are refreshed in the background)"""
+    key = traffic_cell(lat, lon)
+    traffic, fresh = traffic_cache.get_stale(key)
+    if fresh:
+        return traffic
+    if traffic is not None:
+        revalidate_in_background(traffic_flight, key, fetch_traffic_for_point, key, lat, lon)
+        return traffic
+    return traffic_flight.do(key, fetch_traffic_for_point, key, lat, lon, deadline)
+
+def fetch_traffic_for_point(key, lat, lon, deadline=None):
     try:
         params = {
             "key": tomtom_api_key,
@@ -603,58 +1034,42 @@ def get_traffic_for_point(lat, lon):
         }
         
         url = f"{tomtom_traffic_url}?key={tomtom_api_key}&point={lat},{lon}&unit=KMPH"
-        res = requests.get(url, timeout=5)
+        res = tomtom_client.get(url, deadline=deadline)
         
         if res.status_code == 200:
             data = res.json()
             if "flowSegmentData" in data:
                 flow = data["flowSegmentData"]
-                return {
+                traffic = {
                     "current_speed": flow.get("currentSpeed", 0),
                     "free_flow_speed": flow.get("freeFlowSpeed", 0),
                     "current_travel_time": flow.get("currentTravelTime", 0),
                     "free_flow_travel_time": flow.get("freeFlowTravelTime", 0),
                     "confidence": flow.get("confidence", 0)
                 }
+                # The reading describes the whole road segment TomTom matched, so later
+                # points anywhere along it are served from the cache
+                cells = {key}
+                coordinates = flow.get("coordinates", {}).get("coordinate", [])
+                if coordinates:
+                    cells |= segment_cells(coordinates)
+                traffic_cache.set_many((cell, traffic) for cell in cells)
+                return traffic
         return None
     except Exception as e:
         print(f"Traffic fetch error for ({lat}, {lon}):", e)
         return None
 
-def get_traffic_data(geometry):
-    """Sample traffic data along route"""
-    if not geometry or len(geometry) < 2:
-        return {
-            "status": "unknown",
-            "delay_minutes": 0,
-            "average_speed": 0
-        }
-    
-    # Sample fewer points for traffic (every 20km to reduce API calls)
-    sampled_points = sample_route_points(geometry, interval_km=20)
-    
-    if len(sampled_points) < 2:
-        return {
-            "status": "unknown",
-            "delay_minutes": 0,
-            "average_speed": 0
-        }
-    
-    traffic_data = []
+def summarize_traffic(readings):
+    """Route-level traffic status from the flow readings of its sample points"""
+    traffic_data = [traffic for traffic in readings if traffic]
+    speeds = [traffic["current_speed"] for traffic in traffic_data]
     total_delay = 0
-    speeds = []
-    
-    # Get traffic for sampled points
-    for point in sampled_points[:5]:  # Limit to 5 points to avoid rate limits
-        traffic = get_traffic_for_point(point["lat"], point["lon"])
-        if traffic:
-            traffic_data.append(traffic)
-            speeds.append(traffic["current_speed"])
-            
-            # Calculate delay
-            if traffic["free_flow_travel_time"] > 0:
-                delay_seconds = traffic["current_travel_time"] - traffic["free_flow_travel_time"]
-                total_delay += delay_seconds
+    for traffic in traffic_data:
+        # Calculate delay
+        if traffic["free_flow_travel_time"] > 0:
+            delay_seconds = traffic["current_travel_time"] - traffic["free_flow_travel_time"]
+            total_delay += delay_seconds
     
     if not speeds:
         return {
@@ -726,9 +1141,10 @@ def api_get_forecast(city):
     
     lat, lon = city_info["lat"], city_info["lon"]
     
-    # Get forecasts
+    # Get forecasts (independent of each other, so in parallel)
+    aqi_future = executor.submit(get_aqi_forecast, lat, lon)
     weather_list = get_weather_forecast(lat, lon)
-    aqi_list = get_aqi_forecast(lat, lon)
+    aqi_list = aqi_future.result()
     
     if not weather_list:
         return jsonify({"error": "Forecast data unavailable"}), 500
@@ -742,6 +1158,147 @@ def api_get_forecast(city):
         "forecast": forecast_data
     })
 
+def route_query_key(src_city, dest_city, mode):
+    """Normalized (source, destination, mode) identity of a route query"""
+    return (normalize_name(src_city), normalize_name(dest_city), mode)
+
+def plan_route(src_city, dest_city, mode):
+    """
+    Everything about a route query that does not depend on the user:
+    {"src_data", "dest_data", "multi_route_data", "body", "record", "geometry_ids"} where
+    body is the serialized /api/route response and record the history document minus user
+    fields. Missing parts are None.
+    """
+    # Get weather data for both cities concurrently
+    src_future = task_executor.submit(get_weather, src_city)
+    dest_future = task_executor.submit(get_weather, dest_city)
+    plan = {
+        "src_data": src_future.result(),
+        "dest_data": dest_future.result(),
+        "multi_route_data": None,
+        "body": None,
+        "record": None,
+        "geometry_ids": None
+    }
+    src_data, dest_data = plan["src_data"], plan["dest_data"]
+    if not src_data or not dest_data:
+        return plan
+    
+    # Calculate multiple routes
+    multi_route_data = get_multiple_routes(src_data, dest_data, mode)
+    plan["multi_route_data"] = multi_route_data
+    if not multi_route_data:
+        return plan
+    
+    # Calculate additional metrics
+    dist_geo = round(geodesic((src_data["lat"], src_data["lon"]),
+                              (dest_data["lat"], dest_data["lon"])).km, 2)
+    diff_temp = round(dest_data["temp"] - src_data["temp"], 1)
+    
+    # Calculate averages
+    avg_temp = round((src_data["temp"] + dest_data["temp"]) / 2, 1)
+    avg_wind_speed = round((src_data["wind_speed"] + dest_data["wind_speed"]) / 2, 1)
+    
+    # Enhance each route with source/destination data
+    enhanced_routes = []
+    plan["geometry_ids"] = []
+    for route in multi_route_data["routes"]:
+        # Responses carry the simplified shape; finer levels are fetched by geometry_id
+        geometry_id, geometry, geometry_lod = route_geometry_lod(route["geometry"])
+        plan["geometry_ids"].append(geometry_id)
+        
+        # Create map for this route
+        map_file = create_map(src_data, dest_data, geometry)
+        
+        enhanced_route = {
+            "name": route["name"],
+            "type": route["type"],
+            "distance": route["distance"],
+            "duration": route["duration"],
+            "aqi": route["aqi"],
+            "exposure": route["exposure"],
+            "score": route["score"],
+            "source": src_data,
+            "destination": dest_data,
+            "averages": {
+                "aqi": route["aqi"],
+                "temperature": avg_temp,
+                "wind_speed": avg_wind_speed
+            },
+            "geometry": geometry,
+            "geometry_id": geometry_id,
+            "geometry_lod": geometry_lod,
+            "map_file": map_file,
+            "distance_geo": dist_geo,
+            "temperature_difference": diff_temp,
+            "traffic": route.get("traffic"),
+            "traffic_adjusted_duration": route.get("traffic_adjusted_duration")
+        }
+        enhanced_routes.append(enhanced_route)
+    
+    # Prepare route data for storage (store recommended route, at full resolution)
+    recommended_route = enhanced_routes[multi_route_data["recommended"]]
+    recommended_geometry = multi_route_data["routes"][multi_route_data["recommended"]]["geometry"]
+    plan["record"] = {
+        "source": src_data,
+        "destination": dest_data,
+        "route": {
+            "distance": recommended_route["distance"],
+            "duration": recommended_route["duration"],
+            **compact_geometry(recommended_geometry)
+        },
+        "averages": recommended_route["averages"],
+        "distance_geo": dist_geo,
+        "temperature_difference": diff_temp,
+        "map_file": recommended_route["map_file"],
+        "mode": mode
+    }
+    
+    # Serialized once per plan; cache hits send these bytes as they are
+    plan["body"] = app.json.dumps({
+        "success": True,
+        "routes": enhanced_routes,
+        "recommended": multi_route_data["recommended"],
+        "mode": mode
+    }, separators=(",", ":"))
+    return plan
+
+def route_geometry_lod(geometry):
+    """
+    Simplify a route geometry to every LOD level in one pass and cache the levels as
+    polylines under a content-derived geometry_id.
+    Returns (geometry_id, geometry at ROUTE_GEOMETRY_TOLERANCE_M, LOD summary for the response).
+    """
+    levels = simplify_levels(geometry, GEOMETRY_LOD_TOLERANCES_M)
+    encoded = {tolerance: encode_polyline(coords, GEOMETRY_PRECISION) for tolerance, coords in levels.items()}
+    geometry_id = hashlib.sha1(encoded[0.0].encode("ascii")).hexdigest()[:16]
+    route_geometry_cache.set(geometry_id, {
+        tolerance: (polyline, len(levels[tolerance])) for tolerance, polyline in encoded.items()
+    })
+    display = levels[ROUTE_GEOMETRY_TOLERANCE_M]
+    return geometry_id, display, {
+        "tolerance_m": ROUTE_GEOMETRY_TOLERANCE_M,
+        "points": len(display),
+        "full_points": len(geometry),
+        "levels": GEOMETRY_LOD_TOLERANCES_M
+    }
+
+def ensure_route_geometries(plan):
+    """Rebuild the LOD levels of a cached plan's routes if they have left route_geometry_cache"""
+    routes = plan["multi_route_data"]["routes"]
+    for geometry_id, route in zip(plan.get("geometry_ids") or (), routes):
+        if not route_geometry_cache.contains(geometry_id):
+            route_geometry_lod(route["geometry"])
+
+def plan_route_cached(key, src_city, dest_city, mode):
+    """plan_route() through the route cache; only complete plans are cached"""
+    plan = route_cache.get(key)
+    if plan is None:
+        plan = plan_route(src_city, dest_city, mode)
+        if plan["body"] is not None:
+            route_cache.set(key, plan)
+    return plan
+
 @app.route("/api/route", methods=["POST"])
 def api_get_route():
     """Get multiple route options between two cities"""
@@ -757,97 +1314,104 @@ def api_get_route():
         if not src_city or not dest_city:
             return jsonify({"error": "Both source and destination are required"}), 400
         
-        # Get weather data for both cities
-        src_data = get_weather(src_city)
-        dest_data = get_weather(dest_city)
-        
-        if not src_data:
+        # Served from the route cache when possible; identical queries in flight within
+        # the same time bucket share one run. An expired plan is only served when a fresh
+        # one cannot be built (routing circuit open, or the pipeline failed).
+        key = route_query_key(src_city, dest_city, mode)
+        plan, fresh = route_cache.get_stale(key)
+        cache_status = "HIT"
+        if not fresh:
+            stale = plan
+            if stale is not None and ors_client.breaker.is_open():
+                plan, cache_status = stale, "STALE"
+            else:
+                cache_status = "MISS"
+                flight_key = (*key, int(time.time() // ROUTE_TIME_BUCKET))
+                plan = route_flight.do(flight_key, plan_route_cached, key, src_city, dest_city, mode)
+                if plan["body"] is None and stale is not None:
+                    plan, cache_status = stale, "STALE"
+        
+        if not plan["src_data"]:
             return jsonify({"error": f"Source city '{src_city}' not found"}), 404
-        if not dest_data:
+        if not plan["dest_data"]:
             return jsonify({"error": f"Destination city '{dest_city}' not found"}), 404
-        
-        # Calculate multiple routes
-        multi_route_data = get_multiple_routes(src_data, dest_data, mode)
-        if not multi_route_data:
+        if not plan["multi_route_data"]:
             return jsonify({"error": "Route calculation failed"}), 500
+        if cache_status != "MISS":
+            ensure_route_geometries(plan)
         
-        # Calculate additional metrics
-        dist_geo = round(geodesic((src_data["lat"], src_data["lon"]),
-                                  (dest_data["lat"], dest_data["lon"])).km, 2)
-        diff_temp = round(dest_data["temp"] - src_data["temp"], 1)
-        
-        # Calculate averages
-        avg_temp = round((src_data["temp"] + dest_data["temp"]) / 2, 1)
-        avg_wind_speed = round((src_data["wind_speed"] + dest_data["wind_speed"]) / 2, 1)
-        
-        # Enhance each route with source/destination data
-        enhanced_routes = []
-        for route in multi_route_data["routes"]:
-            # Create map for this route
-            map_file = create_map(src_data, dest_data, route["geometry"])
-            
-            enhanced_route = {
-                "name": route["name"],
-                "type": route["type"],
-                "distance": route["distance"],
-                "duration": route["duration"],
-                "aqi": route["aqi"],
-                "score": route["score"],
-                "source": src_data,
-                "destination": dest_data,
-                "averages": {
-                    "aqi": route["aqi"],
-                    "temperature": avg_temp,
-                    "wind_speed": avg_wind_speed
-                },
-                "geometry": route["geometry"],
-                "map_file": map_file,
-                "distance_geo": dist_geo,
-                "temperature_difference": diff_temp,
-                "traffic": route.get("traffic"),
-                "traffic_adjusted_duration": route.get("traffic_adjusted_duration")
-            }
-            enhanced_routes.append(enhanced_route)
-        
-        # Prepare route data for storage (store recommended route)
-        recommended_route = enhanced_routes[multi_route_data["recommended"]]
-        route_record = {
-            "user_email": data.get("user_email"),
-            "source": src_data,
-            "destination": dest_data,
-            "route": {
-                "distance": recommended_route["distance"],
-                "duration": recommended_route["duration"],
-                "geometry": recommended_route["geometry"]
-            },
-            "averages": recommended_route["averages"],
-            "distance_geo": dist_geo,
-            "temperature_difference": diff_temp,
-            "map_file": recommended_route["map_file"],
-            "mode": mode,
-            "created_at": datetime.now().isoformat()
-        }
-        
-        # Store route in MongoDB (if user_email provided)
+        # Queue route for MongoDB storage (if user_email provided); written in the background.
+        # The cached plan is shared, so each record is a fresh top-level copy.
         if data.get("user_email"):
-            try:
-                db = get_db()
-                db.routes.insert_one(route_record)
-                print(f"Route stored for user: {data.get('user_email')}")
-            except Exception as e:
-                print(f"Error storing route: {e}")
+            route_record = dict(
+                plan["record"],
+                user_email=data.get("user_email"),
+                created_at=datetime.now().isoformat()
+            )
+            if route_write_queue.put(route_record):
+                print(f"Route queued for user: {data.get('user_email')}")
         
         # Return multiple routes
-        return jsonify({
-            "success": True,
-            "routes": enhanced_routes,
-            "recommended": multi_route_data["recommended"],
-            "mode": mode
-        })
+        response = Response(plan["body"], mimetype="application/json")
+        response.headers["X-Cache"] = cache_status
+        return response
     except Exception as e:
         print(f"Route calculation error: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
+@app.route("/api/route/geometry/<geometry_id>", methods=["GET"])
+def api_get_route_geometry(geometry_id):
+    """Get a planned route's geometry at a level of detail (?tolerance= meters, 0 or absent = full resolution)"""
+    try:
+        tolerance = float(request.args.get("tolerance", 0))
+    except ValueError:
+        tolerance = math.nan
+    if not math.isfinite(tolerance):
+        return jsonify({"error": "tolerance must be a number of meters"}), 400
+    
+    levels = route_geometry_cache.get(geometry_id)
+    if levels is None:
+        return jsonify({"error": "Geometry not found or expired, request the route again"}), 404
+    
+    # The coarsest precomputed level that is at least as detailed as requested
+    level = max(t for t in levels if t <= max(tolerance, 0.0))
+    polyline, points = levels[level]
+    response = jsonify({
+        "success": True,
+        "geometry_id": geometry_id,
+        "tolerance_m": level,
+        "points": points,
+        "geometry": decode_polyline(polyline, GEOMETRY_PRECISION)
+    })
+    # geometry_id is derived from the content, so a response never changes
+    response.headers["Cache-Control"] = "public, max-age=86400, immutable"
+    return response
+
+@app.route("/api/stats", methods=["GET"])
+def api_get_stats():
+    """Get upstream provider and cache stats"""
+    return jsonify({
+        "success": True,
+        "providers": {client.name: client.stats() for client in PROVIDER_CLIENTS},
+        "caches": cache_stats(),
+        "singleflight": singleflight_stats(),
+        "aqi_field": aqi_field.stats(),
+        "write_queue": route_write_queue.stats(),
+        "gazetteer": {"entries": len(gazetteer)},
+        "model": {"enabled": ML_ENABLED, "ready": recommender.ready, "version": recommender.model_version},
+        "aqi_snapshots": aqi_snapshots.stats()
+    })
+
+@app.route("/api/city/suggest", methods=["GET"])
+def api_suggest_city():
+    """Autocomplete city names from the local gazetteer"""
+    query = request.args.get("q", "")
+    limit = max(1, min(request.args.get("limit", 8, type=int), 10))
+    return jsonify({
+        "success": True,
+        "suggestions": gazetteer.suggest(query, limit)
+    })
+
 @app.route("/api/city/<city>", methods=["GET"])
 def api_find_city(city):
     """Find city information"""
@@ -856,29 +1420,90 @@ def api_find_city(city):
         return jsonify({"error": "City not found"}), 404
     return jsonify(city_info)
 
+# Fields the history list views render; geometry and full weather snapshots are fetched per route
+HISTORY_PROJECTION = {
+    "_id": {"$toString": "$_id"},
+    "created_at": 1,
+    "mode": 1,
+    "source": {"city": "$source.city", "aqi": "$source.aqi"},
+    "destination": {"city": "$destination.city", "aqi": "$destination.aqi"},
+    "route": {"distance": "$route.distance", "duration": "$route.duration"},
+    "averages": 1,
+    "distance_geo": 1,
+    "temperature_difference": 1
+}
+HISTORY_PAGE_SIZE = 20
+HISTORY_MAX_PAGE_SIZE = 100
+
 @app.route("/api/history/<user_email>", methods=["GET"])
 def api_get_history(user_email):
-    """Get user's route history"""
+    """Get a page of the user's route history, newest first (?before=<next_before cursor>&limit=)"""
+    limit = max(1, min(request.args.get("limit", HISTORY_PAGE_SIZE, type=int), HISTORY_MAX_PAGE_SIZE))
+    
+    # Keyset pagination on (created_at, _id) so routes saved with the same timestamp
+    # are never skipped between pages; the cursor is "<created_at>|<_id>"
+    query = {"user_email": user_email}
+    before = request.args.get("before")
+    if before:
+        created_at, _, last_id = before.rpartition("|")
+        try:
+            last_id = ObjectId(last_id)
+        except InvalidId:
+            return jsonify({"error": "Invalid before cursor"}), 400
+        query["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": last_id}}
+        ]
+    
     try:
         db = get_db()
-        # Get routes for the user, sorted by creation date (newest first)
-        routes = list(db.routes.find(
-            {"user_email": user_email}
-        ).sort("created_at", -1).limit(20))  # Limit to last 20 routes
-        
-        # Convert ObjectId to string for JSON serialization
-        for route in routes:
-            route["_id"] = str(route["_id"])
+        routes = list(db.routes.aggregate([
+            {"$match": query},
+            {"$sort": {"created_at": -1, "_id": -1}},
+            {"$limit": limit},
+            {"$project": HISTORY_PROJECTION}
+        ]))
         
         return jsonify({
             "success": True,
             "routes": routes,
-            "count": len(routes)
+            "count": len(routes),
+            "next_before": f"{routes[-1]['created_at']}|{routes[-1]['_id']}" if len(routes) == limit else None
         })
     except Exception as e:
         print(f"History error: {e}")
         return jsonify({"error": "Failed to fetch history"}), 500
 
+@app.route("/api/history/<user_email>/routes/<route_id>/geometry", methods=["GET"])
+def api_get_history_geometry(user_email, route_id):
+    """Get one stored route's geometry, plus the endpoint snapshots needed to draw it"""
+    try:
+        object_id = ObjectId(route_id)
+    except InvalidId:
+        return jsonify({"error": "Invalid route id"}), 400
+    
+    try:
+        db = get_db()
+        record = db.routes.find_one(
+            {"_id": object_id, "user_email": user_email},
+            {"route": 1, "source": 1, "destination": 1, "mode": 1}
+        )
+        if not record:
+            return jsonify({"error": "Route not found"}), 404
+        
+        route = expand_geometry(record.get("route", {}))
+        return jsonify({
+            "success": True,
+            "route_id": route_id,
+            "geometry": route.get("geometry", []),
+            "source": record.get("source"),
+            "destination": record.get("destination"),
+            "mode": record.get("mode")
+        })
+    except Exception as e:
+        print(f"History geometry error: {e}")
+        return jsonify({"error": "Failed to fetch route geometry"}), 500
+
 @app.route("/api/user/<user_email>", methods=["GET"])
 def api_get_user(user_email):
     """Get user profile data"""
@@ -908,102 +1533,68 @@ def api_get_user(user_email):
         print(f"User fetch error: {e}")
         return jsonify({"error": "Failed to fetch user data"}), 500
 
+# PDF exports are built in the background and cached on disk per (user, latest route)
+report_jobs = ReportJobs(
+    directory=os.getenv("REPORT_DIR") or None,
+    max_workers=int(os.getenv("REPORT_WORKERS", 2))
+)
+
+def find_history_for_export(db, user_email):
+    """Projected cursor over the user's routes, newest first"""
+    return db.routes.find(
+        {"user_email": user_email},
+        HISTORY_EXPORT_PROJECTION
+    ).sort("created_at", -1).batch_size(500)
+
+def report_status_payload(user_email, job_id):
+    status = report_jobs.status(job_id)
+    payload = {
+        "success": status != "failed",
+        "job_id": job_id,
+        "status": status,
+        "status_url": url_for("api_history_report_status", user_email=user_email, job_id=job_id)
+    }
+    if status == "done":
+        payload["download_url"] = url_for("api_history_report_file", user_email=user_email, job_id=job_id)
+    elif status == "failed":
+        payload["error"] = report_jobs.error(job_id)
+    return payload
+
 @app.route("/api/history/<user_email>/download/<format>", methods=["GET"])
 def api_download_history(user_email, format):
-    """Download user's route history in CSV or PDF format"""
+    """Download user's route history: CSV is streamed, PDF is served once its background job is done"""
     try:
         db = get_db()
-        # Get all routes for the user
-        routes = list(db.routes.find(
-            {"user_email": user_email}
-        ).sort("created_at", -1))
         
         if format == "csv":
-            import csv
-            import io
-            
-            output = io.StringIO()
-            writer = csv.writer(output)
-            
-            # Write header
-            writer.writerow([
-                "Date", "Source", "Destination", "Distance (km)", "Duration (min)",
-                "Source AQI", "Dest AQI", "Avg AQI", "Avg Temp (°C)", "Avg Wind (m/s)"
-            ])
-            
-            # Write data
-            for route in routes:
-                writer.writerow([
-                    route["created_at"][:10],  # Date only
-                    route["source"]["city"],
-                    route["destination"]["city"],
-                    route["route"]["distance"],
-                    route["route"]["duration"],
-                    route["source"]["aqi"],
-                    route["destination"]["aqi"],
-                    route["averages"]["aqi"],
-                    route["averages"]["temperature"],
-                    route["averages"]["wind_speed"]
-                ])
-            
-            from flask import Response
-            output.seek(0)
+            routes = find_history_for_export(db, user_email)
             return Response(
-                output.getvalue(),
+                stream_with_context(iter_history_csv(routes)),
                 mimetype="text/csv",
                 headers={"Content-Disposition": f"attachment; filename=route_history_{user_email}.csv"}
             )
         
         elif format == "pdf":
-            from reportlab.lib.pagesizes import letter
-            from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-            from reportlab.lib.styles import getSampleStyleSheet
-            from reportlab.lib import colors
-            import io
-            
-            buffer = io.BytesIO()
-            doc = SimpleDocTemplate(buffer, pagesize=letter)
-            styles = getSampleStyleSheet()
-            story = []
-            
-            # Title
-            title = Paragraph(f"Route History for {user_email}", styles['Title'])
-            story.append(title)
-            story.append(Spacer(1, 20))
-            
-            # Create table
-            data = [["Date", "Source", "Destination", "Distance", "Duration", "Avg AQI"]]
-            for route in routes:
-                data.append([
-                    route["created_at"][:10],
-                    route["source"]["city"],
-                    route["destination"]["city"],
-                    f"{route['route']['distance']} km",
-                    f"{route['route']['duration']} min",
-                    str(route["averages"]["aqi"])
-                ])
-            
-            table = Table(data)
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 14),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black)
-            ]))
-            
-            story.append(table)
-            doc.build(story)
-            
-            buffer.seek(0)
-            return Response(
-                buffer.getvalue(),
-                mimetype="application/pdf",
-                headers={"Content-Disposition": f"attachment; filename=route_history_{user_email}.pdf"}
+            # The newest route's timestamp versions the report: a new route means a new PDF
+            latest = db.routes.find_one(
+                {"user_email": user_email},
+                {"created_at": 1},
+                sort=[("created_at", -1)]
             )
+            version = latest["created_at"] if latest else "empty"
+            job_id = report_jobs.submit(
+                user_email, version,
+                lambda path: build_history_pdf(path, user_email, find_history_for_export(get_db(), user_email))
+            )
+            
+            if report_jobs.status(job_id) == "done":
+                return send_file(
+                    report_jobs.path(job_id),
+                    mimetype="application/pdf",
+                    as_attachment=True,
+                    download_name=f"route_history_{user_email}.pdf"
+                )
+            return jsonify(report_status_payload(user_email, job_id)), 202
         
         else:
             return jsonify({"error": "Invalid format. Use 'csv' or 'pdf'"}), 400
@@ -1012,6 +1603,30 @@ def api_download_history(user_email, format):
         print(f"Download error: {e}")
         return jsonify({"error": "Failed to generate download"}), 500
 
+@app.route("/api/history/<user_email>/reports/<job_id>", methods=["GET"])
+def api_history_report_status(user_email, job_id):
+    """Status of a PDF export job"""
+    if not report_jobs.owns(user_email, job_id):
+        return jsonify({"error": "Report not found"}), 404
+    payload = report_status_payload(user_email, job_id)
+    if payload["status"] is None:
+        return jsonify({"error": "Report not found"}), 404
+    return jsonify(payload)
+
+@app.route("/api/history/<user_email>/reports/<job_id>/file", methods=["GET"])
+def api_history_report_file(user_email, job_id):
+    """Download a finished PDF export"""
+    if not report_jobs.owns(user_email, job_id):
+        return jsonify({"error": "Report not found"}), 404
+    if report_jobs.status(job_id) != "done":
+        return jsonify({"error": "Report is not ready"}), 404
+    return send_file(
+        report_jobs.path(job_id),
+        mimetype="application/pdf",
+        as_attachment=True,
+        download_name=f"route_history_{user_email}.pdf"
+    )
+
 # ----------------- AUTHENTICATION ROUTES -----------------
 @app.route("/api/auth/signup", methods=["POST"])
 def api_signup():
@@ -1190,6 +1805,12 @@ MAJOR_CITIES = {
     "Nagpur": {"lat": 21.1458, "lon": 79.0882},
 }
 
+# Fill gazetteer gaps with the built-in city tables (bundled file entries take precedence)
+for _state, _info in STATE_CAPITALS.items():
+    gazetteer.add(_info["capital"], _info["lat"], _info["lon"], state=_state, overwrite=False)
+for _name, _info in MAJOR_CITIES.items():
+    gazetteer.add(_name, _info["lat"], _info["lon"], overwrite=False)
+
 def get_aqi_color_status(aqi_val):
     if aqi_val <= 50:
         return "Good", "#22c55e" # Green
@@ -1204,72 +1825,126 @@ def get_aqi_color_status(aqi_val):
     else:
         return "Hazardous", "#7f1d1d" # Maroon
 
-@app.route('/api/states/aqi', methods=['GET'])
-def get_states_aqi():
-    states_data = []
-    
-    def fetch_state_aqi(state_info):
-        state, info = state_info
-        aqi_url = f"http://api.openweathermap.org/data/2.5/air_pollution?lat={info['lat']}&lon={info['lon']}&appid={weather_api_key}"
+# ----------------- AQI SNAPSHOTS -----------------
+# The state and city tables are rebuilt in the background every AQI_SNAPSHOT_INTERVAL
+# seconds and served from memory, so dashboard views never wait on OWM.
+AQI_SNAPSHOT_INTERVAL = int(os.getenv("AQI_SNAPSHOT_INTERVAL", 900))
+_snapshot_pollution = {}  # (lat, lon) -> last good pollution entry
+
+def fetch_snapshot_pollution(coords):
+    """
+    Fetch each coordinate once; fall back to its last good reading on failure.
+    Coordinates in the tile cache cost nothing; the others are limited to what OWM's
+    rate limit allows right now, so a build never queues behind the token bucket.
+    Returns (readings, number of coordinates without a current reading).
+    """
+    def fetch(coord):
         try:
-            res = requests.get(aqi_url, timeout=5).json()
-            if "list" in res and len(res["list"]) > 0:
-                raw_aqi = res["list"][0]["main"]["aqi"]
-                components = res["list"][0].get("components")
-                aqi_val = convert_aqi_to_raw(raw_aqi, components)
-                status, color = get_aqi_color_status(aqi_val)
-                return {
-                    "state": state,
-                    "aqi": aqi_val,
-                    "status": status,
-                    "color": color
-                }
+            pollution = fetch_pollution(*coord)
         except Exception as e:
-            print(f"Error fetching AQI for {state}: {e}")
-        return None
+            print(f"Error fetching AQI for {coord}: {e}")
+            pollution = None
+        return coord, pollution
 
-    results = list(executor.map(fetch_state_aqi, STATE_CAPITALS.items()))
-    
-    states_data = [r for r in results if r]
-    return jsonify({"success": True, "states": states_data})
+    cached, misses = [], []
+    for coord in coords:
+        (cached if aqi_tile_cached(*coord) else misses).append(coord)
+    budget = int(min(owm_client.capacity(), len(misses)))
+    readings = {}
+    missing = len(misses) - budget
+    for coord, pollution in executor.map(fetch, cached + misses[:budget]):
+        if pollution is not None:
+            _snapshot_pollution[coord] = pollution
+        else:
+            missing += 1
+    for coord in coords:
+        if coord in _snapshot_pollution:
+            readings[coord] = _snapshot_pollution[coord]
+    return readings, missing
+
+def build_aqi_snapshots():
+    """Build the /api/states/aqi and /api/cities/aqi payloads from one set of lookups"""
+    # State capitals and major cities share many coordinates (Mumbai, Delhi, Chennai, ...)
+    coords = {(info["lat"], info["lon"]) for info in STATE_CAPITALS.values()}
+    coords.update((info["lat"], info["lon"]) for info in MAJOR_CITIES.values())
+    readings, missing = fetch_snapshot_pollution(sorted(coords))
+    if not readings:
+        raise RuntimeError("no AQI readings available")
+
+    states_data = []
+    for state, info in STATE_CAPITALS.items():
+        pollution = readings.get((info["lat"], info["lon"]))
+        if pollution is None:
+            continue
+        aqi_val = convert_aqi_to_raw(pollution["main"]["aqi"], pollution.get("components"))
+        aqi_field.observe(info["lat"], info["lon"], aqi_val, pollution.get("dt"))
+        status, color = get_aqi_color_status(aqi_val)
+        states_data.append({
+            "state": state,
+            "aqi": aqi_val,
+            "status": status,
+            "color": color
+        })
 
-@app.route('/api/cities/aqi', methods=['GET'])
-def get_cities_aqi():
     cities_data = []
-    
-    def fetch_city_aqi(city_info):
-        name, info = city_info
-        aqi_url = f"http://api.openweathermap.org/data/2.5/air_pollution?lat={info['lat']}&lon={info['lon']}&appid={weather_api_key}"
-        try:
-            res = requests.get(aqi_url, timeout=3).json()
-            if "list" in res and len(res["list"]) > 0:
-                raw_aqi = res["list"][0]["main"]["aqi"]
-                components = res["list"][0].get("components")
-                aqi_val = convert_aqi_to_raw(raw_aqi, components)
-                
-                main_pollutant = "PM2.5"
-                if components:
-                    main_pollutant = max(components, key=components.get).upper()
-
-                status, color = get_aqi_color_status(aqi_val)
-
-                return {
-                    "name": name,
-                    "lat": info["lat"],
-                    "lon": info["lon"],
-                    "aqi": aqi_val,
-                    "status": status,
-                    "color": color,
-                    "pollutant": main_pollutant
-                }
-        except Exception as e:
-            print(f"Error fetching AQI for {name}: {e}")
-        return None
+    for name, info in MAJOR_CITIES.items():
+        pollution = readings.get((info["lat"], info["lon"]))
+        if pollution is None:
+            continue
+        components = pollution.get("components")
+        aqi_val = convert_aqi_to_raw(pollution["main"]["aqi"], components)
+        aqi_field.observe(info["lat"], info["lon"], aqi_val, pollution.get("dt"))
+        
+        main_pollutant = "PM2.5"
+        if components:
+            main_pollutant = max(components, key=components.get).upper()
 
-    results = list(executor.map(fetch_city_aqi, MAJOR_CITIES.items()))
-        
-    cities_data = [r for r in results if r]
-    return jsonify({"success": True, "cities": cities_data})
+        status, color = get_aqi_color_status(aqi_val)
+        cities_data.append({
+            "name": name,
+            "lat": info["lat"],
+            "lon": info["lon"],
+            "aqi": aqi_val,
+            "status": status,
+            "color": color,
+            "pollutant": main_pollutant
+        })
+
+    payloads = {
+        "states": {"success": True, "states": states_data},
+        "cities": {"success": True, "cities": cities_data}
+    }
+    if missing:
+        # Served as far as it goes; the refresher retries soon and fills in from the tile cache
+        raise IncompleteBuild(payloads, f"{missing}/{len(coords)} coordinates without a current reading")
+    return payloads
+
+aqi_snapshots = SnapshotRefresher(
+    "aqi-snapshots", build_aqi_snapshots, interval=AQI_SNAPSHOT_INTERVAL,
+    coverage_fn=lambda key, payload: len(payload[key])
+)
+if AQI_FIELD_SEED:
+    aqi_snapshots.start()
+
+def snapshot_response(key):
+    """Serve a snapshot with ETag/Last-Modified, answering 304 when the client is current"""
+    snapshot = aqi_snapshots.get(key)
+    if snapshot is None:
+        return jsonify({"success": False, "error": "AQI data is temporarily unavailable"}), 503
+    response = Response(snapshot.body, mimetype="application/json")
+    response.set_etag(snapshot.etag)
+    response.last_modified = snapshot.last_modified
+    response.cache_control.public = True
+    response.cache_control.max_age = 60
+    return response.make_conditional(request)
+
+@app.route('/api/states/aqi', methods=['GET'])
+def get_states_aqi():
+    return snapshot_response("states")
+
+@app.route('/api/cities/aqi', methods=['GET'])
+def get_cities_aqi():
+    return snapshot_response("cities")
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))  # Use Render's PORT
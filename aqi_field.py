@@ -0,0 +1,150 @@
+import heapq
+import math
+import threading
+import time
+
+import numpy as np
+
+from geo import EARTH_RADIUS_KM, geohash_encode
+
+# Interpolated AQI field over a sparse set of recent observations (anchors):
+# state capitals and major cities from the AQI snapshots, route endpoints and
+# every point looked up live. Estimates use inverse-distance weighting; each
+# comes with a confidence in [0, 1] that falls off with the distance to, and the
+# age of, the best nearby anchor, so callers only go upstream where it is low.
+
+
+def pairwise_km(lats_a, lons_a, lats_b, lons_b):
+    """Haversine distance matrix (len(a) x len(b)) in km"""
+    lat_a = np.radians(np.asarray(lats_a, dtype=float))[:, None]
+    lon_a = np.radians(np.asarray(lons_a, dtype=float))[:, None]
+    lat_b = np.radians(np.asarray(lats_b, dtype=float))[None, :]
+    lon_b = np.radians(np.asarray(lons_b, dtype=float))[None, :]
+    a = np.sin((lat_b - lat_a) / 2) ** 2 + np.cos(lat_a) * np.cos(lat_b) * np.sin((lon_b - lon_a) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class AQIField:
+    """
+    Anchors are kept one per geohash cell (the newest observation wins), at most
+    max_anchors, and dropped once older than max_age seconds.
+    An anchor d km away and t seconds old supports a point with
+    exp(-d / length_km) * 0.5 ** (t / half_life); the point's confidence is the
+    best support among anchors within radius_km.
+    """
+
+    def __init__(self, length_km=25, half_life=7200, radius_km=75, max_age=6 * 3600,
+                 max_anchors=5000, precision=6):
+        self.length_km = length_km
+        self.half_life = half_life
+        self.radius_km = radius_km
+        self.max_age = max_age
+        self.max_anchors = max_anchors
+        self.precision = precision
+        self._anchors = {}  # cell -> (lat, lon, aqi, observed_at)
+        self._by_age = []   # heap of (observed_at, cell); entries for replaced anchors are skipped lazily
+        self._arrays = None
+        self._lock = threading.Lock()
+        self._stats = {"observations": 0, "estimates": 0, "confident": 0}
+
+    def observe(self, lat, lon, aqi, observed_at=None):
+        """Record an AQI reading at a coordinate (observed_at is a Unix timestamp, default now)"""
+        if aqi is None:
+            return
+        observed_at = time.time() if observed_at is None else float(observed_at)
+        cell = geohash_encode(lat, lon, self.precision)
+        with self._lock:
+            self._stats["observations"] += 1
+            current = self._anchors.get(cell)
+            if current is not None and current[3] > observed_at:
+                return
+            self._anchors[cell] = (float(lat), float(lon), float(aqi), observed_at)
+            heapq.heappush(self._by_age, (observed_at, cell))
+            while len(self._anchors) > self.max_anchors:
+                oldest_at, oldest = heapq.heappop(self._by_age)
+                anchor = self._anchors.get(oldest)
+                if anchor is not None and anchor[3] == oldest_at:
+                    del self._anchors[oldest]
+            if len(self._by_age) > 2 * len(self._anchors) + 64:
+                self._by_age = [(a[3], c) for c, a in self._anchors.items()]
+                heapq.heapify(self._by_age)
+            self._arrays = None
+
+    def _current(self, now):
+        # Caller holds the lock; (lats, lons, aqis, observed_at) arrays of live anchors
+        if self._arrays is not None and (len(self._arrays[3]) == 0 or self._arrays[3].min() > now - self.max_age):
+            return self._arrays
+        self._anchors = {c: a for c, a in self._anchors.items() if a[3] > now - self.max_age}
+        values = np.array(list(self._anchors.values()), dtype=float).reshape(-1, 4)
+        self._arrays = (values[:, 0], values[:, 1], values[:, 2], values[:, 3])
+        return self._arrays
+
+    def estimate(self, lats, lons):
+        """
+        (aqi, confidence) arrays for the given coordinates. aqi is NaN (and
+        confidence 0) where no anchor lies within radius_km.
+        """
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        now = time.time()
+        with self._lock:
+            a_lats, a_lons, a_aqi, a_time = self._current(now)
+        aqi = np.full(len(lats), np.nan)
+        confidence = np.zeros(len(lats))
+        if len(lats) == 0 or len(a_lats) == 0:
+            return aqi, confidence
+
+        # Only anchors near the points' bounding box can contribute
+        lat_margin = self.radius_km / 111.0
+        lon_margin = lat_margin / max(math.cos(math.radians(np.abs(lats).max())), 0.1)
+        near = (
+            (a_lats >= lats.min() - lat_margin) & (a_lats <= lats.max() + lat_margin) &
+            (a_lons >= lons.min() - lon_margin) & (a_lons <= lons.max() + lon_margin)
+        )
+        if near.any():
+            distance = pairwise_km(lats, lons, a_lats[near], a_lons[near])
+            freshness = 0.5 ** (np.maximum(now - a_time[near], 0.0) / self.half_life)
+            within = distance < self.radius_km
+            support = np.where(within, np.exp(-distance / self.length_km) * freshness, 0.0)
+            # Inverse-distance weights (squared, softened by 1 km so an anchor at the point dominates without dividing by zero)
+            weights = np.where(within, freshness / (distance ** 2 + 1.0), 0.0)
+            total = weights.sum(axis=1)
+            covered = total > 0
+            aqi[covered] = (weights[covered] @ a_aqi[near]) / total[covered]
+            confidence = support.max(axis=1)
+
+        with self._lock:
+            self._stats["estimates"] += len(lats)
+        return aqi, confidence
+
+    def gaps(self, lats, lons, min_confidence):
+        """
+        Indices of the points to look up live so that, once observed, every point
+        would reach min_confidence: points are walked in order and one is picked
+        whenever it is neither confident already nor covered by an earlier pick.
+        """
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        _, confidence = self.estimate(lats, lons)
+        with self._lock:
+            self._stats["confident"] += int((confidence >= min_confidence).sum())
+        # Distance at which a fresh anchor still gives min_confidence
+        coverage_km = -self.length_km * math.log(min_confidence) if 0 < min_confidence < 1 else 0.0
+        candidates = np.flatnonzero(confidence < min_confidence)
+        near = pairwise_km(lats[candidates], lons[candidates], lats[candidates], lons[candidates]) <= coverage_km
+        covered = np.zeros(len(candidates), dtype=bool)
+        picked = []
+        for k in range(len(candidates)):
+            if covered[k]:
+                continue
+            picked.append(int(candidates[k]))
+            covered |= near[k]
+        return picked
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["anchors"] = len(self._anchors)
+        stats["length_km"] = self.length_km
+        stats["half_life"] = self.half_life
+        return stats
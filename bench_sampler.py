@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Benchmark the vectorized route sampler against the legacy per-segment geopy loop.
+Usage: python bench_sampler.py [n_vertices] [route_km]
+"""
+import sys
+import time
+
+import numpy as np
+from geopy.distance import geodesic
+
+from geo import RouteSampler
+
+
+def legacy_sample_route_points(geometry, interval_km=5):
+    """Previous implementation: one geodesic solve per segment, samples snap to the next vertex"""
+    sampled_points = [{"lat": geometry[0][1], "lon": geometry[0][0], "distance": 0}]
+    total_distance = 0
+    last_sampled_distance = 0
+    for i in range(1, len(geometry)):
+        prev_point = (geometry[i-1][1], geometry[i-1][0])
+        curr_point = (geometry[i][1], geometry[i][0])
+        total_distance += geodesic(prev_point, curr_point).km
+        if total_distance - last_sampled_distance >= interval_km:
+            sampled_points.append({"lat": geometry[i][1], "lon": geometry[i][0], "distance": round(total_distance, 2)})
+            last_sampled_distance = total_distance
+    sampled_points.append({"lat": geometry[-1][1], "lon": geometry[-1][0], "distance": round(total_distance, 2)})
+    return sampled_points
+
+
+def synthetic_route(n_vertices, route_km):
+    """Wiggly Delhi -> southbound route of roughly route_km with n_vertices points"""
+    rng = np.random.default_rng(42)
+    t = np.linspace(0, 1, n_vertices)
+    lat = 28.6139 - t * (route_km / 111.0) + 0.05 * np.sin(t * 40) + rng.normal(0, 0.0005, n_vertices)
+    lon = 77.2090 + 0.3 * np.sin(t * 6) + rng.normal(0, 0.0005, n_vertices)
+    return np.column_stack([lon, lat]).tolist()
+
+
+def timed(fn, repeat=3):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    n_vertices = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    route_km = float(sys.argv[2]) if len(sys.argv) > 2 else 1200
+    geometry = synthetic_route(n_vertices, route_km)
+
+    print(f"Route: {n_vertices} vertices, ~{route_km:.0f} km")
+
+    legacy_time, _ = timed(lambda: (legacy_sample_route_points(geometry, 10), legacy_sample_route_points(geometry, 20)), repeat=1)
+    print(f"legacy geopy loop (10 km + 20 km): {legacy_time * 1000:8.1f} ms")
+
+    geodesic_total = sum(
+        geodesic((geometry[i-1][1], geometry[i-1][0]), (geometry[i][1], geometry[i][0])).km
+        for i in range(1, len(geometry))
+    )
+
+    for mode in ("haversine", "ellipsoidal"):
+        elapsed, sampler = timed(lambda: RouteSampler(geometry, mode))
+        sample_time, samples = timed(lambda: sampler.sample_many([10, 20]))
+        error = abs(sampler.total_km - geodesic_total) / geodesic_total
+        print(
+            f"{mode:>11} sampler (10 km + 20 km): {(elapsed + sample_time) * 1000:8.1f} ms  "
+            f"speedup x{legacy_time / (elapsed + sample_time):.0f}  "
+            f"total {sampler.total_km:.3f} km vs geodesic {geodesic_total:.3f} km (error {error:.2e})  "
+            f"samples {len(samples[10])}/{len(samples[20])}"
+        )
+
+
+if __name__ == "__main__":
+    main()
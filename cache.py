@@ -0,0 +1,368 @@
+import os
+import pickle
+from abc import ABC, abstractmethod
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+# Registry of named caches so their hit rates can be reported from /api/stats
+CACHES = {}
+
+# Backend for caches created with make_cache(): "memory" (per process) or
+# "sqlite" (one WAL database per cache under CACHE_DIR, shared by every worker on the host).
+# Values are pickled, so CACHE_DIR must only be writable by the app's own user: it is
+# created with mode 0o700 and refused if another user owns it or can write to it.
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_DIR = os.getenv("CACHE_DIR") or os.path.join(
+    tempfile.gettempdir(), f"breathway-cache-{os.getuid()}" if hasattr(os, "getuid") else "breathway-cache"
+)
+
+
+def ensure_private_dir(path, setting="CACHE_DIR"):
+    """
+    Create path as a private directory, refusing one another user could have planted
+    files in (setting names the option to point elsewhere). An existing directory of
+    ours that others can read is narrowed to 0o700.
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    if not hasattr(os, "getuid"):
+        return
+    st = os.stat(path)
+    if st.st_uid != os.getuid() or st.st_mode & 0o022:
+        raise RuntimeError(
+            f"Directory {path} must be owned by uid {os.getuid()} and not writable by others; "
+            f"fix its permissions or set {setting}"
+        )
+    if st.st_mode & 0o077:
+        os.chmod(path, 0o700)
+
+
+class CacheBackend(ABC):
+    """
+    Interface shared by the cache implementations: get/set/delete/clear/stats
+    with a per-entry TTL and a bounded number of entries.
+    Expired entries are kept for another stale_ttl seconds so get_stale() can serve
+    them while the caller refreshes (stale-while-revalidate); get() never returns them.
+    Hit and miss counters are per process.
+    """
+
+    def __init__(self, name, maxsize=1024, ttl=300, stale_ttl=0):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._stale_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        CACHES[name] = self
+
+    @abstractmethod
+    def get(self, key, default=None):
+        """Return the cached value for key, or default if missing or expired"""
+
+    @abstractmethod
+    def get_stale(self, key, default=None):
+        """
+        (value, fresh): the cached value and whether it is still within its TTL.
+        Expired values within the stale window come back with fresh=False;
+        anything older, or missing, returns (default, False).
+        """
+
+    @abstractmethod
+    def contains(self, key, allow_stale=False):
+        """True if get() (or get_stale() with allow_stale) would return a value; not counted in stats"""
+
+    @abstractmethod
+    def set(self, key, value, ttl=None):
+        pass
+
+    def set_many(self, items, ttl=None):
+        """Store every (key, value) pair in items with the same TTL"""
+        for key, value in items:
+            self.set(key, value, ttl)
+
+    @abstractmethod
+    def delete(self, key):
+        pass
+
+    @abstractmethod
+    def clear(self):
+        pass
+
+    @abstractmethod
+    def __len__(self):
+        pass
+
+    def _count(self, hit, stale=False):
+        with self._lock:
+            if hit:
+                self._hits += 1
+            elif stale:
+                self._stale_hits += 1
+            else:
+                self._misses += 1
+
+    def stats(self):
+        size = len(self)
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "backend": type(self).__name__,
+                "size": size,
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "stale_ttl": self.stale_ttl,
+                "hits": self._hits,
+                "stale_hits": self._stale_hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "hit_rate": round(self._hits / lookups, 3) if lookups else 0
+            }
+
+
+class MemoryCache(CacheBackend):
+    """Thread-safe in-memory cache with per-entry TTL and LRU eviction"""
+
+    def __init__(self, name, maxsize=1024, ttl=300, stale_ttl=0):
+        super().__init__(name, maxsize, ttl, stale_ttl)
+        self._data = OrderedDict()
+
+    def _lookup(self, key, now):
+        # Caller holds the lock; drops entries past their stale window
+        entry = self._data.get(key)
+        if entry is not None and entry[1] + self.stale_ttl <= now:
+            del self._data[key]
+            return None
+        return entry
+
+    def get(self, key, default=None):
+        now = time.time()
+        with self._lock:
+            entry = self._lookup(key, now)
+            if entry is None or entry[1] <= now:
+                self._misses += 1
+                return default
+            self._data.move_to_end(key)
+            self._hits += 1
+            return entry[0]
+
+    def get_stale(self, key, default=None):
+        now = time.time()
+        with self._lock:
+            entry = self._lookup(key, now)
+            if entry is None:
+                self._misses += 1
+                return default, False
+            self._data.move_to_end(key)
+            if entry[1] <= now:
+                self._stale_hits += 1
+                return entry[0], False
+            self._hits += 1
+            return entry[0], True
+
+    def contains(self, key, allow_stale=False):
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+        if entry is None:
+            return False
+        return entry[1] > now or (allow_stale and entry[1] + self.stale_ttl > now)
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteCache(CacheBackend):
+    """
+    Cache stored in a SQLite database in WAL mode, so every worker process on the
+    host reads and fills the same entries. Values are pickled; keys must have a
+    stable repr() (strings, numbers and tuples of them).
+    Reads never write: eviction is oldest-stored-first and runs every
+    PRUNE_EVERY sets, so the table may briefly exceed maxsize.
+    SQLite errors and unreadable values are logged and treated as misses (unreadable
+    entries are deleted), never raised to callers.
+    """
+
+    PRUNE_EVERY = 64
+
+    def __init__(self, name, maxsize=1024, ttl=300, stale_ttl=0, directory=None):
+        super().__init__(name, maxsize, ttl, stale_ttl)
+        self.directory = directory or CACHE_DIR
+        self.path = os.path.join(self.directory, f"{name}.sqlite")
+        self._local = threading.local()
+        self._sets = 0
+        ensure_private_dir(self.directory)
+        self._connect().execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL, stored_at REAL NOT NULL)"
+        )
+        self._connect().execute("CREATE INDEX IF NOT EXISTS entries_stored_at ON entries (stored_at)")
+
+    def _connect(self):
+        # One connection per thread, reopened after fork
+        pid = os.getpid()
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != pid:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = pid
+        return conn
+
+    def get(self, key, default=None):
+        value, fresh = self._read(key, default, allow_stale=False)
+        return value
+
+    def get_stale(self, key, default=None):
+        return self._read(key, default, allow_stale=True)
+
+    def contains(self, key, allow_stale=False):
+        now = time.time()
+        try:
+            row = self._connect().execute(
+                "SELECT expires_at FROM entries WHERE key = ?", (repr(key),)
+            ).fetchone()
+        except sqlite3.Error:
+            return False
+        return row is not None and (row[0] > now or (allow_stale and row[0] + self.stale_ttl > now))
+
+    def _read(self, key, default, allow_stale):
+        now = time.time()
+        try:
+            row = self._connect().execute(
+                "SELECT value, expires_at FROM entries WHERE key = ?", (repr(key),)
+            ).fetchone()
+            fresh = row is not None and row[1] > now
+            stale = row is not None and not fresh and allow_stale and row[1] + self.stale_ttl > now
+            if not fresh and not stale:
+                self._count(False)
+                return default, False
+        except sqlite3.Error as e:
+            print(f"Cache {self.name} read error: {e}")
+            self._count(False)
+            return default, False
+        try:
+            value = pickle.loads(row[0])
+        except Exception as e:
+            # Corrupt, truncated or written by incompatible code: drop it and treat as a miss
+            print(f"Cache {self.name} dropping unreadable entry: {e!r}")
+            self.delete(key)
+            self._count(False)
+            return default, False
+        self._count(fresh, stale=not fresh)
+        return value, fresh
+
+    def set(self, key, value, ttl=None):
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        try:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO entries (key, value, expires_at, stored_at) VALUES (?, ?, ?, ?)",
+                (repr(key), pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), expires_at, now)
+            )
+        except sqlite3.Error as e:
+            print(f"Cache {self.name} write error: {e}")
+            return
+        with self._lock:
+            self._sets += 1
+            prune = self._sets % self.PRUNE_EVERY == 0
+        if prune:
+            self.prune()
+
+    def set_many(self, items, ttl=None):
+        """Store every (key, value) pair in one transaction"""
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        rows = [
+            (repr(key), pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), expires_at, now)
+            for key, value in items
+        ]
+        if not rows:
+            return
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("BEGIN")
+                conn.executemany(
+                    "INSERT OR REPLACE INTO entries (key, value, expires_at, stored_at) VALUES (?, ?, ?, ?)",
+                    rows
+                )
+        except sqlite3.Error as e:
+            print(f"Cache {self.name} write error: {e}")
+            return
+        with self._lock:
+            before = self._sets
+            self._sets += len(rows)
+            prune = self._sets // self.PRUNE_EVERY != before // self.PRUNE_EVERY
+        if prune:
+            self.prune()
+
+    def prune(self):
+        """Drop entries past their stale window, then the oldest ones beyond maxsize"""
+        try:
+            conn = self._connect()
+            conn.execute("DELETE FROM entries WHERE expires_at <= ?", (time.time() - self.stale_ttl,))
+            excess = len(self) - self.maxsize
+            if excess > 0:
+                conn.execute(
+                    "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY stored_at LIMIT ?)",
+                    (excess,)
+                )
+                with self._lock:
+                    self._evictions += excess
+        except sqlite3.Error as e:
+            print(f"Cache {self.name} prune error: {e}")
+
+    def delete(self, key):
+        try:
+            self._connect().execute("DELETE FROM entries WHERE key = ?", (repr(key),))
+        except sqlite3.Error as e:
+            print(f"Cache {self.name} write error: {e}")
+
+    def clear(self):
+        try:
+            self._connect().execute("DELETE FROM entries")
+        except sqlite3.Error as e:
+            print(f"Cache {self.name} write error: {e}")
+
+    def __len__(self):
+        try:
+            return self._connect().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        except sqlite3.Error:
+            return 0
+
+
+def make_cache(name, maxsize=1024, ttl=300, stale_ttl=0):
+    """Create a cache on the configured CACHE_BACKEND"""
+    if CACHE_BACKEND == "sqlite":
+        return SQLiteCache(name, maxsize=maxsize, ttl=ttl, stale_ttl=stale_ttl)
+    if CACHE_BACKEND == "memory":
+        return MemoryCache(name, maxsize=maxsize, ttl=ttl, stale_ttl=stale_ttl)
+    raise ValueError(f"Unknown CACHE_BACKEND: {CACHE_BACKEND}")
+
+
+def cache_stats():
+    """Stats for every registered cache, keyed by cache name"""
+    return {name: c.stats() for name, c in CACHES.items()}
@@ -0,0 +1,69 @@
+import numpy as np
+
+# Time-weighted AQI exposure along a route.
+# ORS steps give the duration of each stretch of the geometry (way_points are vertex
+# indices), which is spread over the stretch's vertices by distance. AQI samples are
+# interpolated onto every vertex by distance along the route, and the trapezoid
+# integral over time gives the dose in AQI-minutes. Slow, congested stretches weigh
+# more than fast ones, and where the samples fall matters far less than with a plain
+# mean of the samples.
+
+
+def vertex_minutes(cumulative_km, steps=None, duration_min=None):
+    """
+    Minutes from the start at which each vertex is reached.
+    steps are ORS steps ({"duration": seconds, "way_points": [first, last]}); without
+    usable steps the route's duration is spread evenly by distance.
+    """
+    cumulative_km = np.asarray(cumulative_km, dtype=float)
+    n = len(cumulative_km)
+    total_km = cumulative_km[-1] if n else 0.0
+    if steps and all(0 <= s["way_points"][0] <= s["way_points"][1] < n for s in steps):
+        starts = np.array([s["way_points"][0] for s in steps])
+        ends = np.array([s["way_points"][1] for s in steps])
+        durations = np.array([s["duration"] for s in steps], dtype=float) / 60
+        step_started = np.concatenate(([0.0], np.cumsum(durations)[:-1]))
+
+        k = np.clip(np.searchsorted(starts, np.arange(n), side="right") - 1, 0, len(steps) - 1)
+        span = cumulative_km[ends[k]] - cumulative_km[starts[k]]
+        frac = np.divide(cumulative_km - cumulative_km[starts[k]], span, out=np.ones(n), where=span > 0)
+        minutes = step_started[k] + durations[k] * np.clip(frac, 0.0, 1.0)
+        return np.maximum.accumulate(minutes)
+    if duration_min and total_km > 0:
+        return cumulative_km / total_km * duration_min
+    return np.zeros(n)
+
+
+def route_exposure(cumulative_km, sample_km, sample_aqi, steps=None, duration_min=None, delay_factor=1.0):
+    """
+    Exposure metrics for a route whose vertices lie at cumulative_km, given AQI
+    samples at sample_km along it (increasing, ideally covering both endpoints):
+    {"exposure" (AQI-min), "minutes", "mean_aqi", "peak_aqi", "p90_aqi"}.
+    mean and p90 are weighted by time spent, not by number of samples.
+    delay_factor stretches the travel times (traffic-adjusted / free-flow duration).
+    """
+    sample_aqi = np.asarray(sample_aqi, dtype=float)
+    minutes = vertex_minutes(cumulative_km, steps, duration_min) * delay_factor
+    total = float(minutes[-1]) if len(minutes) else 0.0
+    if total <= 0 or len(sample_aqi) == 0:
+        mean = float(sample_aqi.mean()) if len(sample_aqi) else 0.0
+        peak = float(sample_aqi.max()) if len(sample_aqi) else 0.0
+        return {"exposure": 0.0, "minutes": 0.0, "mean_aqi": round(mean), "peak_aqi": round(peak), "p90_aqi": round(peak)}
+
+    aqi = np.interp(cumulative_km, sample_km, sample_aqi)
+    dt = np.diff(minutes)
+    stretch_aqi = (aqi[:-1] + aqi[1:]) / 2
+    exposure = float(stretch_aqi @ dt)
+
+    # 90th percentile of the AQI experienced, over time rather than over samples
+    order = np.argsort(stretch_aqi)
+    time_below = np.cumsum(dt[order])
+    p90 = stretch_aqi[order][min(np.searchsorted(time_below, 0.9 * total), len(order) - 1)]
+
+    return {
+        "exposure": round(exposure, 1),
+        "minutes": round(total, 1),
+        "mean_aqi": round(exposure / total),
+        "peak_aqi": round(float(aqi.max())),
+        "p90_aqi": round(float(p90))
+    }
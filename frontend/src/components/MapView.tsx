@@ -2,7 +2,7 @@ import { useEffect, useRef, useState } from "react";
 import L from "leaflet";
 import "leaflet/dist/leaflet.css";
 import { Card } from "@/components/ui/card";
-import { RouteInfo } from "@/lib/api";
+import { RouteInfo, apiService } from "@/lib/api";
 
 // Fix for default marker icons in leaflet
 delete (L.Icon.Default.prototype as any)._getIconUrl;
@@ -12,6 +12,9 @@ L.Icon.Default.mergeOptions({
   shadowUrl: "https://cdnjs.cloudflare.com/ajax/libs/leaflet/1.7.1/images/marker-shadow.png",
 });
 
+// Routes arrive simplified; from this zoom level the selected route is drawn at full resolution
+const ROUTE_DETAIL_ZOOM = 11;
+
 interface MapViewProps {
   className?: string;
   routes?: RouteInfo[];
@@ -45,6 +48,10 @@ const MapView = ({ className, routes = [], selectedIndex = 0, onSelectRoute }: M
   const [geoJsonData, setGeoJsonData] = useState<any>(null);
   const [stateAQIData, setStateAQIData] = useState<StateAQI[]>([]);
   const [cityAQIData, setCityAQIData] = useState<CityAQI[]>([]);
+  const [zoom, setZoom] = useState(5);
+  const [detailedGeometry, setDetailedGeometry] = useState<Record<string, number[][]>>({});
+  const fittedRef = useRef<{ routes: RouteInfo[]; selectedIndex: number } | null>(null);
+  const showDetail = zoom >= ROUTE_DETAIL_ZOOM;
 
   // Function to get color based on AQI (Legacy helper for routes, though we accept backend colors now)
   const getAQIColor = (aqi: number) => {
@@ -124,6 +131,7 @@ const MapView = ({ className, routes = [], selectedIndex = 0, onSelectRoute }: M
       // Zoom Handler
       map.on('zoomend', () => {
         updateLayerVisibility(map);
+        setZoom(map.getZoom());
       });
 
       // Legend
@@ -277,6 +285,18 @@ const MapView = ({ className, routes = [], selectedIndex = 0, onSelectRoute }: M
   }, [geoJsonData, stateAQIData, cityAQIData]);
 
 
+  // Fetch the selected route at full resolution once the map is zoomed in far enough
+  useEffect(() => {
+    const route = routes[selectedIndex];
+    const geometryId = route?.geometry_id;
+    if (!showDetail || !geometryId || detailedGeometry[geometryId]) return;
+    if (route.geometry_lod && route.geometry_lod.points >= route.geometry_lod.full_points) return;
+
+    apiService.getRouteGeometry(geometryId)
+      .then(res => setDetailedGeometry(prev => ({ ...prev, [geometryId]: res.geometry })))
+      .catch(error => console.error("Error loading route detail:", error));
+  }, [showDetail, routes, selectedIndex, detailedGeometry]);
+
   // Render Routes (Existing Logic preserved but moved to routeLayerGroup)
   useEffect(() => {
     const map = mapRef.current;
@@ -291,7 +311,8 @@ const MapView = ({ className, routes = [], selectedIndex = 0, onSelectRoute }: M
       // Process all routes
       routes.forEach((route, index) => {
         const isSelected = index === selectedIndex;
-        const routePoints = route.geometry.map(coord => [coord[1], coord[0]] as [number, number]);
+        const detail = isSelected && showDetail && route.geometry_id ? detailedGeometry[route.geometry_id] : undefined;
+        const routePoints = (detail || route.geometry).map(coord => [coord[1], coord[0]] as [number, number]);
 
         // Add route to bounds
         routePoints.forEach(pt => bounds.extend(pt));
@@ -350,14 +371,17 @@ const MapView = ({ className, routes = [], selectedIndex = 0, onSelectRoute }: M
         `);
       routeLayerGroupRef.current.addLayer(destMarker);
 
-      // Fit bounds to show all routes
-      map.fitBounds(bounds, { padding: [50, 50] });
+      // Fit bounds to show all routes (only for new routes or selection, not when detail swaps in)
+      if (!fittedRef.current || fittedRef.current.routes !== routes || fittedRef.current.selectedIndex !== selectedIndex) {
+        map.fitBounds(bounds, { padding: [50, 50] });
+        fittedRef.current = { routes, selectedIndex };
+      }
 
     }
     // Note: I removed the "Default majorCities view" from the route logic because we now have the City AQI layer which serves a better purpose.
     // If no routes are present, the map shows the State/City AQI layers naturally.
 
-  }, [routes, selectedIndex, onSelectRoute]);
+  }, [routes, selectedIndex, onSelectRoute, showDetail, detailedGeometry]);
 
   return (
     <Card className={`overflow-hidden shadow-elevated ${className}`}>
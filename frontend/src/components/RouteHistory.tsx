@@ -13,6 +13,7 @@ interface RouteHistoryProps {
 const RouteHistory = ({ userEmail }: RouteHistoryProps) => {
     const [history, setHistory] = useState<HistoryResponse | null>(null);
     const [loading, setLoading] = useState(true);
+    const [loadingMore, setLoadingMore] = useState(false);
     const navigate = useNavigate();
 
     useEffect(() => {
@@ -32,12 +33,31 @@ const RouteHistory = ({ userEmail }: RouteHistoryProps) => {
         }
     }, [userEmail]);
 
-    const handleRouteClick = (historyItem: any) => {
-        // Map history item to RouteInfo structure
-        // Note: History items from DB might need some adjustment to match RouteInfo exactly if fields are missing
-        // Based on app.py, the structure seems largely compatible but let's ensure safety
+    const handleLoadMore = async () => {
+        if (!history?.next_before) return;
+        setLoadingMore(true);
+        try {
+            const data = await apiService.getHistory(userEmail, history.next_before);
+            setHistory({
+                ...data,
+                routes: [...history.routes, ...data.routes],
+                count: history.count + data.count
+            });
+        } catch (error) {
+            console.error("Failed to fetch more history:", error);
+        } finally {
+            setLoadingMore(false);
+        }
+    };
+
+    const handleRouteClick = async (summary: any) => {
+        // The history list only carries summaries; fetch the stored geometry and
+        // endpoint weather for the selected route before mapping it to RouteInfo
 
         try {
+            const detail = await apiService.getHistoryGeometry(userEmail, summary._id);
+            const historyItem = { ...summary, source: detail.source, destination: detail.destination };
+
             const routeInfo: RouteInfo = {
                 name: historyItem.name || `Route to ${historyItem.destination.city}`,
                 type: 'balanced', // Default fallback
@@ -48,7 +68,7 @@ const RouteHistory = ({ userEmail }: RouteHistoryProps) => {
                 source: historyItem.source,
                 destination: historyItem.destination,
                 averages: historyItem.averages || { aqi: 0, temperature: 0, wind_speed: 0 },
-                geometry: historyItem.route.geometry,
+                geometry: detail.geometry,
                 map_file: historyItem.map_file,
                 distance_geo: historyItem.distance_geo,
                 temperature_difference: historyItem.temperature_difference,
@@ -64,7 +84,7 @@ const RouteHistory = ({ userEmail }: RouteHistoryProps) => {
                 success: true,
                 routes: [routeInfo],
                 recommended: 0,
-                mode: historyItem.mode || 'driving-car'
+                mode: historyItem.mode || detail.mode || 'driving-car'
             };
 
             navigate("/dashboard", { state: { routeData: response } });
@@ -94,8 +114,24 @@ const RouteHistory = ({ userEmail }: RouteHistoryProps) => {
     }
 
     const handleDownload = async (format: 'csv' | 'pdf') => {
+        const apiBase = import.meta.env.VITE_API_URL || 'http://localhost:5000';
         try {
-            const response = await fetch(`${import.meta.env.VITE_API_URL || 'http://localhost:5000'}/api/history/${encodeURIComponent(userEmail)}/download/${format}`);
+            let response = await fetch(`${apiBase}/api/history/${encodeURIComponent(userEmail)}/download/${format}`);
+
+            // PDFs are generated in the background: poll the job until the file is ready
+            if (response.status === 202) {
+                let job = await response.json();
+                while (job.status === 'pending') {
+                    await new Promise((resolve) => setTimeout(resolve, 1000));
+                    job = await (await fetch(`${apiBase}${job.status_url}`)).json();
+                }
+                if (job.status !== 'done') {
+                    console.error('Report generation failed:', job.error);
+                    return;
+                }
+                response = await fetch(`${apiBase}${job.download_url}`);
+            }
+
             if (response.ok) {
                 const blob = await response.blob();
                 const url = window.URL.createObjectURL(blob);
@@ -189,6 +225,17 @@ const RouteHistory = ({ userEmail }: RouteHistoryProps) => {
                         </div>
                     </div>
                 ))}
+                {history.next_before && (
+                    <Button
+                        variant="outline"
+                        size="sm"
+                        className="w-full"
+                        onClick={handleLoadMore}
+                        disabled={loadingMore}
+                    >
+                        {loadingMore ? "Loading..." : "Load more"}
+                    </Button>
+                )}
             </div>
         </Card>
     );
@@ -1,10 +1,10 @@
-import { useState } from "react";
+import { useEffect, useState } from "react";
 import { MapPin, Navigation, Sparkles, Car, Bike, PersonStanding } from "lucide-react";
 import { Button } from "@/components/ui/button";
 import { Input } from "@/components/ui/input";
 import { Card } from "@/components/ui/card";
 import { Label } from "@/components/ui/label";
-import { apiService, RouteResponse } from "@/lib/api";
+import { apiService, CitySuggestion, RouteResponse } from "@/lib/api";
 import { toast } from "sonner";
 
 interface RouteInputPanelProps {
@@ -15,6 +15,24 @@ interface RouteInputPanelProps {
   initialDestination?: string;
 }
 
+// Debounced autocomplete served from the backend's local gazetteer
+const useCitySuggestions = (query: string) => {
+  const [suggestions, setSuggestions] = useState<CitySuggestion[]>([]);
+
+  useEffect(() => {
+    if (query.trim().length < 2) {
+      setSuggestions([]);
+      return;
+    }
+    const timer = setTimeout(() => {
+      apiService.suggestCities(query).then(setSuggestions).catch(() => setSuggestions([]));
+    }, 150);
+    return () => clearTimeout(timer);
+  }, [query]);
+
+  return suggestions;
+};
+
 const RouteInputPanel = ({
   onSearch,
   onRouteData,
@@ -26,6 +44,8 @@ const RouteInputPanel = ({
   const [destination, setDestination] = useState(initialDestination);
   const [mode, setMode] = useState<"driving-car" | "cycling-regular" | "foot-walking">("driving-car");
   const [isLoading, setIsLoading] = useState(false);
+  const sourceSuggestions = useCitySuggestions(source);
+  const destinationSuggestions = useCitySuggestions(destination);
 
   const handleSearch = async () => {
     if (!source || !destination) {
@@ -74,8 +94,14 @@ const RouteInputPanel = ({
               placeholder="Source Location"
               value={source}
               onChange={(e) => setSource(e.target.value)}
+              list="source-suggestions"
               className="pl-11 h-12 shadow-soft focus:shadow-elevated transition-shadow"
             />
+            <datalist id="source-suggestions">
+              {sourceSuggestions.map((city) => (
+                <option key={`${city.name}-${city.lat}`} value={city.name}>{city.state}</option>
+              ))}
+            </datalist>
           </div>
 
           <div className="relative">
@@ -85,8 +111,14 @@ const RouteInputPanel = ({
               placeholder="Destination Location"
               value={destination}
               onChange={(e) => setDestination(e.target.value)}
+              list="destination-suggestions"
               className="pl-11 h-12 shadow-soft focus:shadow-elevated transition-shadow"
             />
+            <datalist id="destination-suggestions">
+              {destinationSuggestions.map((city) => (
+                <option key={`${city.name}-${city.lat}`} value={city.name}>{city.state}</option>
+              ))}
+            </datalist>
           </div>
 
           <div className="space-y-2">
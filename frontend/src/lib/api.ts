@@ -30,6 +30,21 @@ export interface TrafficData {
     samples?: number;
 }
 
+export interface RouteExposure {
+    exposure: number; // AQI-minutes over the trip
+    minutes: number;
+    mean_aqi: number;
+    peak_aqi: number;
+    p90_aqi: number;
+}
+
+export interface GeometryLod {
+    tolerance_m: number; // simplification tolerance of `geometry`
+    points: number;
+    full_points: number;
+    levels: number[]; // tolerances fetchable via getRouteGeometry (0 = full resolution)
+}
+
 export interface RouteInfo {
     name: string;
     type: 'fastest' | 'cleanest' | 'balanced';
@@ -37,6 +52,7 @@ export interface RouteInfo {
     duration: number;
     traffic_adjusted_duration?: number | null;
     aqi: number;
+    exposure?: RouteExposure;
     score: number;
     source: WeatherData;
     destination: WeatherData;
@@ -46,6 +62,8 @@ export interface RouteInfo {
         wind_speed: number;
     };
     geometry: number[][];
+    geometry_id?: string;
+    geometry_lod?: GeometryLod;
     map_file: string;
     distance_geo: number;
     temperature_difference: number;
@@ -70,6 +88,24 @@ export interface HistoryResponse {
     success: boolean;
     routes: any[];
     count: number;
+    next_before: string | null; // opaque cursor for the next page
+}
+
+export interface RouteGeometryResponse {
+    success: boolean;
+    geometry_id: string;
+    tolerance_m: number;
+    points: number;
+    geometry: number[][];
+}
+
+export interface HistoryGeometryResponse {
+    success: boolean;
+    route_id: string;
+    geometry: [number, number][];
+    source: any;
+    destination: any;
+    mode: string;
 }
 
 export interface CityInfo {
@@ -79,6 +115,10 @@ export interface CityInfo {
     country: string;
 }
 
+export interface CitySuggestion extends CityInfo {
+    state?: string | null;
+}
+
 export interface ForecastData {
     date: string;
     day_name: string;
@@ -135,8 +175,31 @@ class ApiService {
         return this.request<CityInfo>(`/city/${encodeURIComponent(city)}`);
     }
 
-    async getHistory(userEmail: string): Promise<HistoryResponse> {
-        return this.request<HistoryResponse>(`/history/${encodeURIComponent(userEmail)}`);
+    async suggestCities(query: string, limit: number = 8): Promise<CitySuggestion[]> {
+        const data = await this.request<{ success: boolean; suggestions: CitySuggestion[] }>(
+            `/city/suggest?q=${encodeURIComponent(query)}&limit=${limit}`
+        );
+        return data.suggestions;
+    }
+
+    async getHistory(userEmail: string, before?: string, limit?: number): Promise<HistoryResponse> {
+        const params = new URLSearchParams();
+        if (before) params.set('before', before);
+        if (limit) params.set('limit', String(limit));
+        const query = params.toString();
+        return this.request<HistoryResponse>(`/history/${encodeURIComponent(userEmail)}${query ? `?${query}` : ''}`);
+    }
+
+    async getRouteGeometry(geometryId: string, tolerance: number = 0): Promise<RouteGeometryResponse> {
+        return this.request<RouteGeometryResponse>(
+            `/route/geometry/${encodeURIComponent(geometryId)}?tolerance=${tolerance}`
+        );
+    }
+
+    async getHistoryGeometry(userEmail: string, routeId: string): Promise<HistoryGeometryResponse> {
+        return this.request<HistoryGeometryResponse>(
+            `/history/${encodeURIComponent(userEmail)}/routes/${encodeURIComponent(routeId)}/geometry`
+        );
     }
 
     async getForecast(city: string): Promise<ForecastResponse> {
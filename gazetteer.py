@@ -0,0 +1,112 @@
+import json
+import os
+import re
+import threading
+import unicodedata
+
+# Local city index so geocoding the same handful of cities never leaves the process.
+# Exact lookups use a normalized-name hash map, autocomplete uses a prefix trie
+# whose nodes keep their best few completions precomputed.
+
+MAX_SUGGESTIONS_PER_NODE = 10
+
+
+def normalize_name(name):
+    """Lowercase, strip accents and punctuation, collapse whitespace"""
+    if not name:
+        return ""
+    name = unicodedata.normalize("NFKD", str(name))
+    name = "".join(c for c in name if not unicodedata.combining(c))
+    name = re.sub(r"[^\w\s]", " ", name.lower())
+    return " ".join(name.split())
+
+
+class Gazetteer:
+    """In-memory geocode index with exact lookup and prefix autocomplete"""
+
+    def __init__(self):
+        self._by_name = {}
+        self._trie = {"top": []}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._by_name)
+
+    def add(self, name, lat, lon, country="IN", state=None, population=0, aliases=(), overwrite=True):
+        """Index a city under its name and any aliases"""
+        entry = {
+            "name": name,
+            "lat": lat,
+            "lon": lon,
+            "country": country,
+            "state": state,
+            "population": population or 0
+        }
+        with self._lock:
+            for key in [name, *aliases]:
+                key = normalize_name(key)
+                if not key or (not overwrite and key in self._by_name):
+                    continue
+                self._by_name[key] = entry
+                self._insert_prefix(key, entry)
+        return entry
+
+    def _insert_prefix(self, key, entry):
+        node = self._trie
+        self._rank(node, entry)
+        for char in key:
+            node = node.setdefault(char, {"top": []})
+            self._rank(node, entry)
+
+    @staticmethod
+    def _rank(node, entry):
+        # Keep the node's completions sorted by population, deduplicated by city name
+        top = [e for e in node["top"] if e["name"] != entry["name"] or e is entry]
+        if entry not in top:
+            top.append(entry)
+        top.sort(key=lambda e: (-e["population"], e["name"]))
+        node["top"] = top[:MAX_SUGGESTIONS_PER_NODE]
+
+    def lookup(self, query):
+        """Exact match on the normalized name, in the find_city() result shape"""
+        entry = self._by_name.get(normalize_name(query))
+        if entry is None:
+            return None
+        return {
+            "name": entry["name"],
+            "lat": entry["lat"],
+            "lon": entry["lon"],
+            "country": entry["country"]
+        }
+
+    def suggest(self, prefix, limit=MAX_SUGGESTIONS_PER_NODE):
+        """Best-known cities whose name or alias starts with prefix"""
+        key = normalize_name(prefix)
+        if not key:
+            return []
+        node = self._trie
+        for char in key:
+            node = node.get(char)
+            if node is None:
+                return []
+        return [
+            {k: entry[k] for k in ("name", "lat", "lon", "country", "state")}
+            for entry in node["top"][:limit]
+        ]
+
+    def load_file(self, path, overwrite=True):
+        """Load a bundled JSON list of {name, lat, lon, state, population, aliases}"""
+        if not os.path.exists(path):
+            return 0
+        with open(path, encoding="utf-8") as f:
+            cities = json.load(f)
+        for city in cities:
+            self.add(
+                city["name"], city["lat"], city["lon"],
+                country=city.get("country", "IN"),
+                state=city.get("state"),
+                population=city.get("population", 0),
+                aliases=city.get("aliases", ()),
+                overwrite=overwrite
+            )
+        return len(cities)
@@ -0,0 +1,279 @@
+# Geospatial helpers shared by the routing and AQI code
+import numpy as np
+
+_GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash_encode(lat, lon, precision=5):
+    """
+    Encode a coordinate as a geohash string.
+    Precision 5 is a ~4.9 km x 4.9 km cell, 6 is ~1.2 km x 0.6 km, 7 is ~150 m.
+    """
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+
+    while len(chars) < precision:
+        rng, value = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            rng[0] = mid
+        else:
+            bits = bits << 1
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_GEOHASH_BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return "".join(chars)
+
+
+# ----------------- ROUTE SAMPLING -----------------
+# Distances are computed for the whole coordinate array at once instead of one
+# geopy.geodesic solve per segment.
+#
+# Accuracy against geopy.distance.geodesic (WGS-84), per segment:
+#   "haversine"   - spherical, mean Earth radius; within 0.6%
+#   "ellipsoidal" - local WGS-84 radii of curvature at the segment midpoint;
+#                   for segments up to 50 km, within 0.001% below 60 degrees of
+#                   latitude and within 0.01% up to 80 degrees (measured worst
+#                   cases); ORS vertices are rarely more than a few km apart,
+#                   where the error is far smaller still
+
+EARTH_RADIUS_KM = 6371.0088
+WGS84_A_KM = 6378.137
+WGS84_E2 = 6.69437999014e-3  # first eccentricity squared
+SAMPLER_MODES = ("haversine", "ellipsoidal")
+
+
+def segment_distances(lats, lons, mode="ellipsoidal"):
+    """Distances in km between consecutive coordinates (arrays in degrees)"""
+    lat = np.radians(np.asarray(lats, dtype=float))
+    lon = np.radians(np.asarray(lons, dtype=float))
+    dlat = np.diff(lat)
+    dlon = np.diff(lon)
+    # Wrap longitude differences across the antimeridian
+    dlon = (dlon + np.pi) % (2 * np.pi) - np.pi
+
+    if mode == "haversine":
+        a = np.sin(dlat / 2) ** 2 + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(dlon / 2) ** 2
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+    if mode == "ellipsoidal":
+        mid = (lat[:-1] + lat[1:]) / 2
+        w = 1 - WGS84_E2 * np.sin(mid) ** 2
+        meridional = WGS84_A_KM * (1 - WGS84_E2) / w ** 1.5
+        prime_vertical = WGS84_A_KM / np.sqrt(w)
+        return np.hypot(meridional * dlat, prime_vertical * np.cos(mid) * dlon)
+    raise ValueError(f"Unknown sampler mode: {mode}")
+
+
+class RouteSampler:
+    """
+    Samples points at fixed distance intervals along an ORS geometry ([lon, lat] pairs).
+    Cumulative distance is computed once, so sampling at several intervals is cheap.
+    """
+
+    def __init__(self, geometry, mode="ellipsoidal"):
+        if geometry is None or len(geometry) == 0:
+            coords = np.empty((0, 2))
+        else:
+            coords = np.asarray(geometry, dtype=float).reshape(-1, 2)
+        self.lons = coords[:, 0]
+        self.lats = coords[:, 1]
+        self.mode = mode
+        if len(coords) >= 2:
+            self.segments = segment_distances(self.lats, self.lons, mode)
+            self.cumulative = np.concatenate(([0.0], np.cumsum(self.segments)))
+        else:
+            self.segments = np.empty(0)
+            self.cumulative = np.zeros(len(coords))
+        self.total_km = float(self.cumulative[-1]) if len(coords) else 0.0
+
+    def __len__(self):
+        return len(self.lats)
+
+    def locate(self, distances):
+        """Interpolated (lats, lons) at the given distances (km) along the route"""
+        d = np.clip(np.asarray(distances, dtype=float), 0.0, self.total_km)
+        idx = np.clip(np.searchsorted(self.cumulative, d, side="right") - 1, 0, len(self.lats) - 2)
+        seg = self.cumulative[idx + 1] - self.cumulative[idx]
+        frac = np.divide(d - self.cumulative[idx], seg, out=np.zeros_like(d), where=seg > 0)
+        lats = self.lats[idx] + frac * (self.lats[idx + 1] - self.lats[idx])
+        lons = self.lons[idx] + frac * (self.lons[idx + 1] - self.lons[idx])
+        return lats, lons
+
+    def sample(self, interval_km):
+        """Points at every interval_km mark, plus the first and last vertex"""
+        return self.sample_many([interval_km])[interval_km]
+
+    def sample_many(self, intervals):
+        """
+        Sample at several intervals in one vectorized pass.
+        Returns {interval_km: [{"lat", "lon", "distance"}, ...]}
+        """
+        if len(self.lats) < 2:
+            return {interval: [] for interval in intervals}
+
+        marks_per_interval = []
+        for interval in intervals:
+            marks = np.arange(interval, self.total_km, interval) if interval > 0 else np.empty(0)
+            marks_per_interval.append(np.concatenate(([0.0], marks, [self.total_km])))
+
+        all_marks = np.concatenate(marks_per_interval)
+        lats, lons = self.locate(all_marks)
+        # Keep the route endpoints exact
+        lats[all_marks == 0] = self.lats[0]
+        lons[all_marks == 0] = self.lons[0]
+        lats[all_marks == self.total_km] = self.lats[-1]
+        lons[all_marks == self.total_km] = self.lons[-1]
+
+        result = {}
+        offset = 0
+        for interval, marks in zip(intervals, marks_per_interval):
+            end = offset + len(marks)
+            result[interval] = [
+                {"lat": float(lat), "lon": float(lon), "distance": round(float(dist), 2)}
+                for lat, lon, dist in zip(lats[offset:end], lons[offset:end], marks)
+            ]
+            offset = end
+        return result
+
+
+def sample_route_points(geometry, interval_km=5, mode="ellipsoidal"):
+    """Sample points along route at specified intervals (in km)"""
+    return RouteSampler(geometry, mode).sample(interval_km)
+
+
+def thin_samples(points, max_points):
+    """Evenly spaced subset of at most max_points samples, keeping the first and last"""
+    if max_points >= len(points):
+        return points
+    max_points = int(max_points)
+    if max_points <= 0:
+        return []
+    if max_points == 1:
+        return points[:1]
+    idx = np.round(np.linspace(0, len(points) - 1, max_points)).astype(int)
+    return [points[i] for i in idx]
+
+
+# ----------------- GEOMETRY ENCODING -----------------
+# Encoded polyline (Google polyline algorithm) with vectorized encode/decode.
+# Precision 5 keeps ~1 m accuracy and typically shrinks a [lon, lat] JSON array 5-10x.
+
+def encode_polyline(geometry, precision=5):
+    """Encode [[lon, lat], ...] as a polyline string (lat, lon order per the format)"""
+    if geometry is None or len(geometry) == 0:
+        return ""
+    coords = np.asarray(geometry, dtype=float).reshape(-1, 2)[:, ::-1]
+    scaled = np.round(coords * 10 ** precision).astype(np.int64)
+    deltas = np.diff(scaled, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    values = np.where(deltas < 0, ~(deltas << 1), deltas << 1)
+
+    # Split every value into 5-bit chunks (low bits first); all but the last get the 0x20 flag
+    chunks = np.zeros((len(values), 13), dtype=np.int64)
+    n_chunks = np.ones(len(values), dtype=np.int64)
+    remaining = values.copy()
+    for i in range(13):
+        chunks[:, i] = remaining & 0x1F
+        remaining >>= 5
+        if not remaining.any():
+            break
+        n_chunks += remaining > 0
+    positions = np.arange(chunks.shape[1])
+    more = positions[None, :] < (n_chunks[:, None] - 1)
+    keep = positions[None, :] < n_chunks[:, None]
+    encoded = (chunks | np.where(more, 0x20, 0)) + 63
+    return encoded[keep].astype(np.uint8).tobytes().decode("ascii")
+
+
+def decode_polyline(polyline, precision=5):
+    """Decode a polyline string back to [[lon, lat], ...]"""
+    if not polyline:
+        return []
+    data = np.frombuffer(polyline.encode("ascii"), dtype=np.uint8).astype(np.int64) - 63
+    # A value ends at the first chunk without the continuation flag
+    ends = (data & 0x20) == 0
+    value_ids = np.concatenate(([0], np.cumsum(ends)[:-1]))
+    starts = np.flatnonzero(np.concatenate(([True], ends[:-1])))
+    shift = 5 * (np.arange(len(data)) - starts[value_ids])
+    values = np.bincount(value_ids, weights=((data & 0x1F) << shift)).astype(np.int64)
+    deltas = np.where(values & 1, ~(values >> 1), values >> 1)
+    coords = np.cumsum(deltas.reshape(-1, 2), axis=0) / 10 ** precision
+    return coords[:, ::-1].tolist()
+
+
+def simplification_tolerances(geometry, min_tolerance_m=0.0):
+    """
+    Douglas-Peucker significance of each vertex of [[lon, lat], ...] in meters:
+    simplifying with tolerance t keeps exactly the vertices whose value exceeds t
+    (endpoints are inf). Splitting stops at min_tolerance_m, so vertices that only
+    matter at finer tolerances get 0.
+    Each split measures all points of the current span at once in a local planar projection.
+    """
+    coords = np.asarray(geometry, dtype=float).reshape(-1, 2) if geometry is not None and len(geometry) else np.empty((0, 2))
+    significance = np.zeros(len(coords))
+    if len(coords) == 0:
+        return significance
+    significance[0] = significance[-1] = np.inf
+    if len(coords) < 3:
+        return significance
+
+    # Equirectangular projection around the mean latitude (meters)
+    scale = np.radians(1) * EARTH_RADIUS_KM * 1000
+    x = coords[:, 0] * scale * np.cos(np.radians(coords[:, 1].mean()))
+    y = coords[:, 1] * scale
+
+    # A vertex's significance is capped by its parent split's, so levels are nested
+    stack = [(0, len(coords) - 1, np.inf)]
+    while stack:
+        start, end, cap = stack.pop()
+        if end - start < 2:
+            continue
+        dx, dy = x[end] - x[start], y[end] - y[start]
+        px, py = x[start + 1:end] - x[start], y[start + 1:end] - y[start]
+        length_sq = dx * dx + dy * dy
+        if length_sq == 0:
+            dist = np.hypot(px, py)
+        else:
+            # Distance to the segment (clamped projection), not the infinite line
+            t = np.clip((px * dx + py * dy) / length_sq, 0.0, 1.0)
+            dist = np.hypot(px - t * dx, py - t * dy)
+        i = int(dist.argmax())
+        d = min(float(dist[i]), cap)
+        if d > min_tolerance_m:
+            split = start + 1 + i
+            significance[split] = d
+            stack.append((start, split, d))
+            stack.append((split, end, d))
+
+    return significance
+
+
+def simplify_line(geometry, tolerance_m):
+    """Douglas-Peucker simplification of [[lon, lat], ...] with a tolerance in meters"""
+    coords = np.asarray(geometry, dtype=float).reshape(-1, 2) if geometry is not None and len(geometry) else np.empty((0, 2))
+    if len(coords) < 3 or tolerance_m <= 0:
+        return coords.tolist()
+    return coords[simplification_tolerances(coords, tolerance_m) > tolerance_m].tolist()
+
+
+def simplify_levels(geometry, tolerances_m):
+    """
+    {tolerance: simplified geometry} for several tolerances from a single
+    Douglas-Peucker pass; a tolerance of 0 returns the geometry unchanged.
+    """
+    coords = np.asarray(geometry, dtype=float).reshape(-1, 2) if geometry is not None and len(geometry) else np.empty((0, 2))
+    positive = [t for t in tolerances_m if t > 0]
+    significance = simplification_tolerances(coords, min(positive)) if positive else None
+    return {
+        t: coords[significance > t].tolist() if t > 0 else coords.tolist()
+        for t in tolerances_m
+    }
@@ -1,15 +1,39 @@
 import os
+import threading
+from collections import OrderedDict
 from datetime import datetime
-# Heavy imports (xgboost, pandas, sklearn) are moved inside methods to save memory on Render
+from tree_ensemble import TreeEnsemble
+from model_registry import ModelRegistry
+# Heavy imports (xgboost, pandas, sklearn) are only needed for training and are moved inside those methods.
+# Serving uses TreeEnsemble, a pure-NumPy evaluator compiled from route_model.json.
+
+# Quantization steps for the prediction memo key, in feature_names order.
+# Routes within these steps of each other share a memoized prediction.
+MEMO_QUANTIZATION = [1.0, 1.0, 5.0, 1.0, 1, 1, 1]
+
 
 class RouteRecommender:
-    def __init__(self, model_path="route_model.json"):
-        self.model = None
+    def __init__(self, model_path="route_model.json", memo_size=256, registry=None):
         self.model_path = model_path
+        # Compiled models are served from the registry; training only ever happens offline
+        self.registry = registry or ModelRegistry(bootstrap_json=model_path)
         self.feature_names = [
             'distance', 'duration', 'aqi', 'traffic_delay',
             'hour', 'day_of_week', 'is_weekend'
         ]
+        # Small LRU of class probabilities keyed on quantized features (0 disables)
+        self.memo_size = memo_size
+        self._memo = OrderedDict()
+        self._memo_version = None
+        self._memo_lock = threading.Lock()
+    
+    @property
+    def model(self):
+        return self.registry.current()[0]
+    
+    @property
+    def model_version(self):
+        return self.registry.current()[1]
         
     def generate_training_data(self, n_samples=200):
         """
@@ -83,7 +107,7 @@ class RouteRecommender:
         
         # Train XGBoost model
         print("Training XGBoost model...")
-        self.model = xgb.XGBClassifier(
+        classifier = xgb.XGBClassifier(
             n_estimators=100,
             max_depth=5,
             learning_rate=0.1,
@@ -92,53 +116,88 @@ class RouteRecommender:
             random_state=42
         )
         
-        self.model.fit(X_train, y_train)
+        classifier.fit(X_train, y_train)
         
         # Evaluate
-        y_pred = self.model.predict(X_test)
+        y_pred = classifier.predict(X_test)
         accuracy = accuracy_score(y_test, y_pred)
         print(f"Model accuracy: {accuracy:.2%}")
         
-        # Save model
-        self.save_model()
+        # Save model, then publish the compiled version to the registry
+        self.save_model(classifier)
+        ensemble = TreeEnsemble.from_xgboost_json(self.model_path)
+        if ensemble.feature_names and ensemble.feature_names != self.feature_names:
+            raise ValueError(f"Model features {ensemble.feature_names} do not match {self.feature_names}")
+        self.registry.publish(ensemble)
         
         return accuracy
     
-    def save_model(self):
-        """Save trained model to file"""
-        if self.model:
-            self.model.save_model(self.model_path)
-            print(f"Model saved to {self.model_path}")
+    def save_model(self, classifier):
+        """Save trained XGBoost classifier to file"""
+        classifier.save_model(self.model_path)
+        print(f"Model saved to {self.model_path}")
     
     def load_model(self):
-        """Load trained model from file"""
-        if os.path.exists(self.model_path):
-            import xgboost as xgb
-            self.model = xgb.XGBClassifier()
-            self.model.load_model(self.model_path)
-            print(f"Model loaded from {self.model_path}")
-            return True
-        return False
+        """Load the current model version from the registry (never trains)"""
+        return self.registry.refresh()
     
-    def predict_preference(self, route_features):
+    def _ensure_model(self):
+        model, version = self.registry.current()
+        if model is None:
+            raise RuntimeError("No route model loaded yet")
+        return model, version
+    
+    def _memo_key(self, row):
+        return tuple(round(value / step) for value, step in zip(row, MEMO_QUANTIZATION))
+    
+    def predict_preferences(self, feature_rows):
         """
-        Predict user preference for a route
-        Returns: 0 (fastest), 1 (cleanest), or 2 (balanced)
+        Predict user preference for several routes with a single model call
+        Returns: (preferences, probabilities) as NumPy arrays, one row per route
         """
-        import pandas as pd
-        if not self.model:
-            if not self.load_model():
-                print("No model found, training new model...")
-                self.train()
+        import numpy as np
+        model, version = self._ensure_model()
         
-        # Prepare features
-        features = pd.DataFrame([route_features])[self.feature_names]
+        X = np.array([[row[name] for name in self.feature_names] for row in feature_rows], dtype=float)
+        probabilities = np.empty((len(X), 3))
         
-        # Predict
-        prediction = self.model.predict(features)[0]
-        probabilities = self.model.predict_proba(features)[0]
+        # Serve repeated (quantized) feature rows from the memo, predict the rest in one batch
+        keys = [self._memo_key(row) for row in X] if self.memo_size else []
+        missing = list(range(len(X)))
+        if self.memo_size:
+            missing = []
+            with self._memo_lock:
+                # Memoized probabilities belong to one model version
+                if self._memo_version != version:
+                    self._memo.clear()
+                    self._memo_version = version
+                for i, key in enumerate(keys):
+                    cached = self._memo.get(key)
+                    if cached is None:
+                        missing.append(i)
+                    else:
+                        self._memo.move_to_end(key)
+                        probabilities[i] = cached
         
-        return int(prediction), probabilities
+        if missing:
+            probabilities[missing] = model.predict_proba(X[missing])
+            if self.memo_size:
+                with self._memo_lock:
+                    for i in missing:
+                        self._memo[keys[i]] = probabilities[i].copy()
+                    while len(self._memo) > self.memo_size:
+                        self._memo.popitem(last=False)
+        
+        # multi:softmax predicts the most probable class, so derive it from the probabilities
+        return probabilities.argmax(axis=1), probabilities
+    
+    def predict_preference(self, route_features):
+        """
+        Predict user preference for a route
+        Returns: 0 (fastest), 1 (cleanest), or 2 (balanced)
+        """
+        preferences, probabilities = self.predict_preferences([route_features])
+        return int(preferences[0]), probabilities[0]
     
     def get_route_scores(self, routes, current_time=None):
         """
@@ -158,13 +217,12 @@ class RouteRecommender:
         day_of_week = current_time.weekday()
         is_weekend = 1 if day_of_week >= 5 else 0
         
-        scored_routes = []
-        
+        feature_rows = []
         for route in routes:
             # Extract features
             traffic_delay = route.get('traffic', {}).get('delay_minutes', 0) if route.get('traffic') else 0
             
-            features = {
+            feature_rows.append({
                 'distance': route['distance'],
                 'duration': route['duration'],
                 'aqi': route['aqi'],
@@ -172,10 +230,15 @@ class RouteRecommender:
                 'hour': hour,
                 'day_of_week': day_of_week,
                 'is_weekend': is_weekend
-            }
-            
-            # Get ML prediction
-            preference, probabilities = self.predict_preference(features)
+            })
+        
+        # Get ML predictions for all routes in one batch
+        preferences, all_probabilities = self.predict_preferences(feature_rows) if routes else ([], [])
+        
+        scored_routes = []
+        
+        for route, preference, probabilities in zip(routes, preferences, all_probabilities):
+            preference = int(preference)
             
             # Calculate ML confidence score
             ml_confidence = float(probabilities[preference])
@@ -209,10 +272,21 @@ class RouteRecommender:
         
         return scored_routes, recommended_idx
 
-# Initialize global recommender
-recommender = RouteRecommender()
+    @property
+    def ready(self):
+        return self.model is not None
+
+# Initialize global recommender; the model is loaded by recommender.registry.start()
+recommender = RouteRecommender(registry=ModelRegistry(
+    directory=os.getenv("MODEL_DIR", "models"),
+    bootstrap_json="route_model.json",
+    poll_interval=int(os.getenv("MODEL_RELOAD_INTERVAL", 60))
+))
 
-# Train model on first import if not exists
-if not recommender.load_model():
-    print("Training initial ML model...")
-    recommender.train()
+if __name__ == "__main__":
+    # Offline training: python ml_model.py train
+    import sys
+    if len(sys.argv) > 1 and sys.argv[1] == "train":
+        recommender.train()
+    else:
+        print("Usage: python ml_model.py train")
@@ -0,0 +1,113 @@
+import os
+import threading
+import time
+from datetime import datetime
+
+from tree_ensemble import TreeEnsemble
+
+# Versioned store of compiled route models.
+#
+# Layout of the registry directory:
+#   route_model-<version>.npz   compiled TreeEnsemble arrays, one file per version
+#   CURRENT                     name of the version to serve
+#
+# Publishing writes the artifact and then swaps CURRENT with os.replace, so
+# readers never see a half-written model. Each worker loads the current version
+# once (in the background) and hot-swaps when CURRENT changes. Nothing here trains.
+
+
+class ModelRegistry:
+    """Loads, publishes and hot-swaps compiled model artifacts"""
+
+    def __init__(self, directory="models", name="route_model", bootstrap_json=None, poll_interval=60):
+        self.directory = directory
+        self.name = name
+        self.bootstrap_json = bootstrap_json
+        self.poll_interval = poll_interval
+        self._active = (None, None)  # (model, version), replaced as a whole on swap
+        self._lock = threading.Lock()
+        self._loaded = threading.Event()
+        self._pid = None
+
+    @property
+    def pointer_path(self):
+        return os.path.join(self.directory, "CURRENT")
+
+    def artifact_path(self, version):
+        return os.path.join(self.directory, f"{self.name}-{version}.npz")
+
+    def current(self):
+        """(model, version) currently being served; (None, None) until a model has loaded"""
+        return self._active
+
+    def current_version(self):
+        """Version named by the CURRENT pointer, or None"""
+        try:
+            with open(self.pointer_path, encoding="utf-8") as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def publish(self, model, version=None):
+        """Write a new artifact, point CURRENT at it and swap it in for this process"""
+        version = version or datetime.now().strftime("%Y%m%d%H%M%S")
+        os.makedirs(self.directory, exist_ok=True)
+
+        tmp_path = self.artifact_path(version) + ".tmp"
+        model.save(tmp_path)
+        os.replace(tmp_path, self.artifact_path(version))
+
+        tmp_pointer = self.pointer_path + ".tmp"
+        with open(tmp_pointer, "w", encoding="utf-8") as f:
+            f.write(version)
+        os.replace(tmp_pointer, self.pointer_path)
+
+        self._swap(model, version)
+        print(f"Published {self.name} version {version}")
+        return version
+
+    def refresh(self):
+        """Load the CURRENT version if it differs from the served one. Returns True if a model is available."""
+        version = self.current_version()
+        if version is not None:
+            if version != self._active[1]:
+                try:
+                    self._swap(TreeEnsemble.load(self.artifact_path(version)), version)
+                    print(f"Loaded {self.name} version {version}")
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"Failed to load {self.name} version {version}: {e}")
+        elif self._active[0] is None and self.bootstrap_json and os.path.exists(self.bootstrap_json):
+            # No published artifact yet: compile the bundled XGBoost JSON in memory
+            version = f"json-{int(os.path.getmtime(self.bootstrap_json))}"
+            self._swap(TreeEnsemble.from_xgboost_json(self.bootstrap_json), version)
+            print(f"Loaded {self.name} from {self.bootstrap_json}")
+        self._loaded.set()
+        return self._active[0] is not None
+
+    def _swap(self, model, version):
+        # Readers take self._active without locking; rebinding the tuple is atomic
+        self._active = (model, version)
+
+    def start(self):
+        """Load in a background thread (once per process) and keep polling for new versions"""
+        pid = os.getpid()
+        with self._lock:
+            if self._pid == pid:
+                return
+            self._pid = pid
+            self._loaded.clear()
+        threading.Thread(target=self._run, name=f"{self.name}-registry", daemon=True).start()
+
+    def wait_until_loaded(self, timeout=None):
+        return self._loaded.wait(timeout)
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Model registry refresh error: {e}")
+                self._loaded.set()
+            if not self.poll_interval:
+                return
+            time.sleep(self.poll_interval)
@@ -0,0 +1,93 @@
+import os
+import queue
+import threading
+
+
+class WriteBehindQueue:
+    """
+    Bounded in-process queue that batches records into one write on a background flusher.
+    put() never waits on the database: when the queue is full it waits at most
+    put_timeout for room and otherwise drops the record (counted in stats).
+    """
+
+    def __init__(self, name, flush_fn, maxsize=1000, batch_size=50, flush_interval=1.0, put_timeout=0.05):
+        self.name = name
+        self.flush_fn = flush_fn
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pid = None
+        self._counters = {"queued": 0, "flushed": 0, "dropped": 0, "failed": 0, "batches": 0}
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self._counters[key] += n
+
+    def _ensure_flusher(self):
+        # Threads do not survive fork: start one flusher per worker process
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._pid = pid
+                    threading.Thread(target=self._run, name=f"{self.name}-flusher", daemon=True).start()
+
+    def put(self, record):
+        """Queue a record for writing. Returns False if it was dropped because the queue is full."""
+        self._ensure_flusher()
+        try:
+            self._queue.put(record, timeout=self.put_timeout)
+        except queue.Full:
+            self._count("dropped")
+            print(f"{self.name}: queue full, dropped record")
+            return False
+        self._count("queued")
+        return True
+
+    def _drain(self, first=None):
+        batch = [] if first is None else [first]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        if not batch:
+            return
+        try:
+            self.flush_fn(batch)
+            self._count("flushed", len(batch))
+            self._count("batches")
+        except Exception as e:
+            self._count("failed", len(batch))
+            print(f"{self.name}: failed to write {len(batch)} records: {e}")
+
+    def _run(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            with self._flush_lock:
+                self._write(self._drain(first))
+
+    def flush(self):
+        """Synchronously write everything still queued (used at shutdown)"""
+        with self._flush_lock:
+            while True:
+                batch = self._drain()
+                if not batch:
+                    return
+                self._write(batch)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats["pending"] = self._queue.qsize()
+        stats["maxsize"] = self._queue.maxsize
+        return stats
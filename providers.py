@@ -0,0 +1,298 @@
+import math
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Shared HTTP clients for upstream providers (OpenWeatherMap, OpenRouteService, TomTom).
+# Each provider gets one keep-alive session so repeated calls reuse warm TCP/TLS connections.
+# Optional per-provider rate limiting: a token bucket for the per-second limit and a
+# daily quota counter. Both are per process; app.py splits the account limits across
+# the WEB_CONCURRENCY worker processes.
+# A circuit breaker per provider stops calls to an upstream that keeps failing, so an
+# outage costs callers nothing until a single probe shows it has recovered.
+
+
+class RateLimited(requests.RequestException):
+    """No request budget left for a provider before the caller's deadline"""
+
+
+class CircuitOpenError(requests.RequestException):
+    """The provider's circuit breaker is open; the call was not attempted"""
+
+
+class CircuitBreaker:
+    """
+    closed -> open after failure_threshold consecutive failures;
+    open -> half_open once reset_timeout has passed, letting a single probe through;
+    half_open -> closed if the probe succeeds, back to open if it fails.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """True if a call may be attempted now"""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._probing = False
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def is_open(self):
+        """True while calls are being rejected (open and not yet due for a probe)"""
+        with self._lock:
+            return self.state == "open" and time.monotonic() - self._opened_at < self.reset_timeout
+
+    def release(self):
+        """Give back a probe slot that was allowed but never used"""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                if self.state != "open":
+                    print(f"{self.name}: circuit opened after {self._failures} consecutive failures")
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def stats(self):
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self._failures}
+
+
+class TokenBucket:
+    """Token bucket refilled at rate tokens/second up to burst"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst or max(rate, 1))
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, timeout=None):
+        """
+        Take one token, waiting for it if necessary. Returns False without waiting
+        if the token would not be available within timeout seconds.
+        Waiters reserve tokens in arrival order (the balance may go negative).
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+            if timeout is not None and wait > timeout:
+                return False
+            self._tokens -= 1
+        if wait > 0:
+            time.sleep(wait)
+        return True
+
+    def available(self, within=0.0):
+        """Tokens that can be taken within the next `within` seconds"""
+        with self._lock:
+            self._refill(time.monotonic())
+            return max(0.0, self._tokens + within * self.rate)
+
+    def drain(self):
+        """Spend the whole balance (used to back off after the provider throttles us)"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, 0.0)
+
+
+class DailyQuota:
+    """Counts calls per UTC day against a fixed limit"""
+
+    def __init__(self, limit):
+        self.limit = int(limit)
+        self._day = None
+        self._used = 0
+        self._lock = threading.Lock()
+
+    def _roll(self):
+        today = datetime.now(timezone.utc).date()
+        if today != self._day:
+            self._day = today
+            self._used = 0
+
+    def take(self):
+        with self._lock:
+            self._roll()
+            if self._used >= self.limit:
+                return False
+            self._used += 1
+            return True
+
+    def remaining(self):
+        with self._lock:
+            self._roll()
+            return self.limit - self._used
+
+
+class ProviderClient:
+    """Pooled, keep-alive HTTP client for a single upstream provider"""
+
+    def __init__(self, name, pool_size=20, timeout=5, rate=None, burst=None, daily_quota=None,
+                 failure_threshold=5, reset_timeout=30):
+        self.name = name
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.breaker = CircuitBreaker(name, failure_threshold, reset_timeout)
+        self._bucket = TokenBucket(rate, burst) if rate else None
+        self._quota = DailyQuota(daily_quota) if daily_quota else None
+        self._lock = threading.Lock()
+        self._session = None
+        self._pid = None
+        self._stats = {
+            "requests": 0,
+            "errors": 0,
+            "rate_limited": 0,
+            "short_circuited": 0,
+            "total_ms": 0.0,
+            "max_ms": 0.0,
+            "status_codes": {}
+        }
+
+    def _get_session(self):
+        # Sessions are not fork-safe: rebuild the pool in each gunicorn worker
+        pid = os.getpid()
+        if self._session is None or self._pid != pid:
+            with self._lock:
+                if self._session is None or self._pid != pid:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(
+                        pool_connections=4,
+                        pool_maxsize=self.pool_size,
+                        pool_block=False
+                    )
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    self._session = session
+                    self._pid = pid
+        return self._session
+
+    def _record(self, elapsed_ms, status_code=None, error=False):
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["total_ms"] += elapsed_ms
+            self._stats["max_ms"] = max(self._stats["max_ms"], elapsed_ms)
+            if error:
+                self._stats["errors"] += 1
+            if status_code is not None:
+                key = str(status_code)
+                self._stats["status_codes"][key] = self._stats["status_codes"].get(key, 0) + 1
+
+    def _limited(self, reason):
+        with self._lock:
+            self._stats["rate_limited"] += 1
+        raise RateLimited(f"{self.name}: {reason}")
+
+    def capacity(self, within=0.0):
+        """How many requests could start within `within` seconds (inf when unlimited, 0 while the circuit is open)"""
+        if self.breaker.is_open():
+            return 0
+        capacity = math.inf
+        if self._bucket is not None:
+            capacity = self._bucket.available(within)
+        if self._quota is not None:
+            capacity = min(capacity, self._quota.remaining())
+        return capacity
+
+    def request(self, method, url, deadline=None, **kwargs):
+        """
+        Send a request through the pooled session, applying the default timeout.
+        deadline is a time.monotonic() value: rate-limit waits never run past it
+        (RateLimited is raised instead) and the request timeout is capped by it.
+        Without a deadline a rate-limit wait is bounded by the client timeout.
+        Raises CircuitOpenError without waiting while the provider's breaker is open;
+        network errors and 5xx responses count as breaker failures.
+        """
+        if not self.breaker.allow():
+            with self._lock:
+                self._stats["short_circuited"] += 1
+            raise CircuitOpenError(f"{self.name}: circuit open")
+        remaining = self.timeout if deadline is None else max(0.0, deadline - time.monotonic())
+        try:
+            if self._bucket is not None and not self._bucket.acquire(timeout=remaining):
+                self._limited("rate limit wait exceeds deadline")
+            if self._quota is not None and not self._quota.take():
+                self._limited("daily quota exhausted")
+        except RateLimited:
+            self.breaker.release()
+            raise
+        if deadline is None:
+            kwargs.setdefault("timeout", self.timeout)
+        else:
+            kwargs.setdefault("timeout", max(0.5, min(self.timeout, deadline - time.monotonic())))
+
+        session = self._get_session()
+        start = time.perf_counter()
+        try:
+            res = session.request(method, url, **kwargs)
+        except requests.RequestException:
+            self._record((time.perf_counter() - start) * 1000, error=True)
+            self.breaker.record_failure()
+            raise
+        self._record((time.perf_counter() - start) * 1000, res.status_code, error=res.status_code >= 500)
+        if res.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        if res.status_code == 429 and self._bucket is not None:
+            self._bucket.drain()
+        return res
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def stats(self):
+        """Snapshot of request counters and latency for this provider"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["status_codes"] = dict(self._stats["status_codes"])
+        stats["avg_ms"] = round(stats["total_ms"] / stats["requests"], 1) if stats["requests"] else 0
+        stats["total_ms"] = round(stats["total_ms"], 1)
+        stats["max_ms"] = round(stats["max_ms"], 1)
+        stats["pool_size"] = self.pool_size
+        stats["timeout"] = self.timeout
+        stats["circuit"] = self.breaker.stats()
+        if self._bucket is not None:
+            stats["rate"] = self._bucket.rate
+            stats["burst"] = self._bucket.burst
+            stats["tokens"] = round(self._bucket.available(), 1)
+        if self._quota is not None:
+            stats["daily_quota"] = self._quota.limit
+            stats["quota_remaining"] = self._quota.remaining()
+        return stats
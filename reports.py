@@ -0,0 +1,225 @@
+import concurrent.futures
+import csv
+import hashlib
+import os
+import re
+import tempfile
+import time
+
+from cache import ensure_private_dir
+
+# History exports.
+# CSV rows are generated straight from a Mongo cursor so a download never holds
+# the whole history in memory. PDFs are built off the request path by ReportJobs
+# and cached on disk under a key that changes whenever the user saves a new route.
+
+HISTORY_EXPORT_PROJECTION = {
+    "_id": 0,
+    "created_at": 1,
+    "source.city": 1,
+    "source.aqi": 1,
+    "destination.city": 1,
+    "destination.aqi": 1,
+    "route.distance": 1,
+    "route.duration": 1,
+    "averages": 1
+}
+
+CSV_HEADER = [
+    "Date", "Source", "Destination", "Distance (km)", "Duration (min)",
+    "Source AQI", "Dest AQI", "Avg AQI", "Avg Temp (°C)", "Avg Wind (m/s)"
+]
+PDF_HEADER = ["Date", "Source", "Destination", "Distance", "Duration", "Avg AQI"]
+PDF_ROWS_PER_TABLE = 40  # about one page per table at the default font size
+JOB_ID_PATTERN = re.compile(r"^[0-9a-f]{16}-[0-9a-f]{16}$")
+
+
+class _LineBuffer:
+    """csv.writer target that hands back each formatted line instead of storing it"""
+
+    def write(self, line):
+        return line
+
+
+def iter_history_csv(routes, rows_per_chunk=100):
+    """Yield the CSV export in chunks of rows_per_chunk lines"""
+    writer = csv.writer(_LineBuffer())
+    chunk = [writer.writerow(CSV_HEADER)]
+    for route in routes:
+        source = route.get("source", {})
+        destination = route.get("destination", {})
+        averages = route.get("averages", {})
+        chunk.append(writer.writerow([
+            route.get("created_at", "")[:10],  # Date only
+            source.get("city"),
+            destination.get("city"),
+            route.get("route", {}).get("distance"),
+            route.get("route", {}).get("duration"),
+            source.get("aqi"),
+            destination.get("aqi"),
+            averages.get("aqi"),
+            averages.get("temperature"),
+            averages.get("wind_speed")
+        ]))
+        if len(chunk) >= rows_per_chunk:
+            yield "".join(chunk)
+            chunk = []
+    if chunk:
+        yield "".join(chunk)
+
+
+def build_history_pdf(path, user_email, routes):
+    """Write the PDF export to path, one page-sized table per PDF_ROWS_PER_TABLE routes"""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib import colors
+
+    style = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 14),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+    ])
+
+    def make_table(rows):
+        table = Table([PDF_HEADER] + rows, repeatRows=1)
+        table.setStyle(style)
+        return table
+
+    styles = getSampleStyleSheet()
+    story = [Paragraph(f"Route History for {user_email}", styles['Title']), Spacer(1, 20)]
+    rows = []
+    for route in routes:
+        rows.append([
+            route.get("created_at", "")[:10],
+            route.get("source", {}).get("city"),
+            route.get("destination", {}).get("city"),
+            f"{route.get('route', {}).get('distance')} km",
+            f"{route.get('route', {}).get('duration')} min",
+            str(route.get("averages", {}).get("aqi"))
+        ])
+        if len(rows) == PDF_ROWS_PER_TABLE:
+            story.append(make_table(rows))
+            rows = []
+    if rows or len(story) == 2:
+        story.append(make_table(rows))
+
+    doc = SimpleDocTemplate(path, pagesize=letter)
+    doc.build(story)
+
+
+class ReportJobs:
+    """
+    Runs report builds on a small dedicated pool and caches the files on disk.
+    A job id is derived from (owner, version), so asking again for an unchanged
+    history returns the finished file instead of rebuilding it.
+    Job state lives in marker files next to the output (<job>.pending, <job>.failed),
+    so every worker process can answer for a job any of them started. A pending
+    marker older than pending_timeout belongs to a dead build and is ignored.
+    The directory holds users' reports and its files are trusted as finished builds,
+    so it must be private to the app's user (see cache.ensure_private_dir).
+    """
+
+    def __init__(self, directory=None, max_workers=2, suffix=".pdf", pending_timeout=600):
+        self.directory = directory or os.path.join(
+            tempfile.gettempdir(), f"breathway-reports-{os.getuid()}" if hasattr(os, "getuid") else "breathway-reports"
+        )
+        ensure_private_dir(self.directory, "REPORT_DIR")
+        self.suffix = suffix
+        self.pending_timeout = pending_timeout
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+
+    @staticmethod
+    def _digest(value):
+        return hashlib.sha1(str(value).encode("utf-8")).hexdigest()[:16]
+
+    def job_id(self, owner, version):
+        return f"{self._digest(owner)}-{self._digest(version)}"
+
+    def owns(self, owner, job_id):
+        """True if job_id is well formed and belongs to owner"""
+        return bool(JOB_ID_PATTERN.match(job_id)) and job_id.startswith(self._digest(owner) + "-")
+
+    def path(self, job_id):
+        return os.path.join(self.directory, job_id + self.suffix)
+
+    def _marker(self, job_id, state):
+        return os.path.join(self.directory, f"{job_id}.{state}")
+
+    def _pending(self, job_id):
+        try:
+            return time.time() - os.path.getmtime(self._marker(job_id, "pending")) < self.pending_timeout
+        except OSError:
+            return False
+
+    def status(self, job_id):
+        """'done', 'pending', 'failed' or None if the job is unknown"""
+        if os.path.exists(self.path(job_id)):
+            return "done"
+        if self._pending(job_id):
+            return "pending"
+        if os.path.exists(self._marker(job_id, "failed")):
+            return "failed"
+        return None
+
+    def error(self, job_id):
+        try:
+            with open(self._marker(job_id, "failed"), encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def submit(self, owner, version, build_fn):
+        """
+        Start build_fn(path) unless the file already exists or a build is running
+        in any process. Returns the job id.
+        """
+        job_id = self.job_id(owner, version)
+        if os.path.exists(self.path(job_id)) or self._pending(job_id):
+            return job_id
+        ensure_private_dir(self.directory, "REPORT_DIR")  # in case a tmp cleaner removed it
+        marker = self._marker(job_id, "pending")
+        # A stale marker from a dead build is replaced; O_EXCL lets one process win the race
+        if os.path.exists(marker):
+            self._remove(marker)
+        try:
+            os.close(os.open(marker, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            return job_id
+        self._remove(self._marker(job_id, "failed"))
+        self._executor.submit(self._run, job_id, build_fn)
+        return job_id
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _run(self, job_id, build_fn):
+        tmp_path = f"{self.path(job_id)}.{os.getpid()}.tmp"
+        try:
+            build_fn(tmp_path)
+            os.replace(tmp_path, self.path(job_id))
+        except Exception as e:
+            print(f"Report {job_id} failed: {e}")
+            self._remove(tmp_path)
+            with open(self._marker(job_id, "failed"), "w", encoding="utf-8") as f:
+                f.write(str(e))
+            return
+        finally:
+            self._remove(self._marker(job_id, "pending"))
+        self._prune(job_id)
+
+    def _prune(self, job_id):
+        # Older versions of the same owner's report (and their markers) are stale now
+        owner_prefix = job_id.split("-")[0] + "-"
+        for name in os.listdir(self.directory):
+            if name.startswith(owner_prefix) and not name.startswith(job_id) and not name.endswith(".pending"):
+                self._remove(os.path.join(self.directory, name))
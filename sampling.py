@@ -0,0 +1,88 @@
+import concurrent.futures
+import time
+
+from geo import geohash_encode, thin_samples
+
+# Request-scoped sample planning across alternative routes.
+# ORS alternatives share long stretches of road, so their sample points largely
+# coincide. A plan snaps every route's points to a geohash grid, looks each unique
+# cell up once and hands the readings back to every route that sampled the cell.
+
+
+class SamplingPlan:
+    """Unique-cell lookups for the sample points of several routes"""
+
+    def __init__(self, name, precision):
+        self.name = name
+        self.precision = precision
+        self._cells = {}   # cell -> representative point (the first one sampled in it)
+        self._routes = []  # per route: the cell of each of its points, in order
+        self._results = {}
+
+    def add_route(self, points):
+        """Register one route's sample points; returns the route's index in the plan"""
+        cells = []
+        for point in points:
+            cell = geohash_encode(point["lat"], point["lon"], self.precision)
+            self._cells.setdefault(cell, point)
+            cells.append(cell)
+        self._routes.append(cells)
+        return len(self._routes) - 1
+
+    def select(self, budget, cached=None):
+        """
+        Cells to look up. Cells that cached(lat, lon) says can be answered locally are
+        always included and cost nothing; each route's other distinct cells are thinned
+        to an even share of budget. Cells shared between routes are looked up once, so
+        overlapping routes end up with more of their points covered.
+        """
+        if not self._routes:
+            return []
+        share = budget / len(self._routes)
+        is_cached = {}
+        selected = {}
+        for cells in self._routes:
+            misses = []
+            for cell in dict.fromkeys(cells):
+                if cell not in is_cached:
+                    point = self._cells[cell]
+                    is_cached[cell] = cached is not None and cached(point["lat"], point["lon"])
+                if is_cached[cell]:
+                    selected[cell] = True
+                else:
+                    misses.append(cell)
+            for cell in thin_samples(misses, share):
+                selected[cell] = True
+        return list(selected)
+
+    def fetch(self, fn, executor, budget=float("inf"), deadline=None, cached=None):
+        """
+        Run fn(lat, lon, deadline) once per selected cell on executor, collecting
+        results until the time.monotonic() deadline. budget only limits cells that
+        miss the cache (see select). Returns the number of lookups.
+        """
+        cells = self.select(budget, cached)
+        futures = {
+            executor.submit(fn, self._cells[cell]["lat"], self._cells[cell]["lon"], deadline): cell
+            for cell in cells
+        }
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        try:
+            for future in concurrent.futures.as_completed(futures, timeout=timeout):
+                try:
+                    self._results[futures[future]] = future.result()
+                except Exception as e:
+                    print(f"{self.name} sample error: {e}")
+        except concurrent.futures.TimeoutError:
+            print(f"{self.name} sampling hit deadline with {len(self._results)}/{len(cells)} cells")
+            for future in futures:
+                future.cancel()
+        return len(cells)
+
+    def values(self, route_index):
+        """Results for a route's points in order (None where no reading is available)"""
+        return [self._results.get(cell) for cell in self._routes[route_index]]
+
+    def stats(self):
+        points = sum(len(cells) for cells in self._routes)
+        return {"routes": len(self._routes), "points": points, "cells": len(self._cells), "fetched": len(self._results)}
@@ -0,0 +1,76 @@
+import threading
+
+# Registry of named single-flight groups so their sharing rates can be reported from /api/stats
+FLIGHTS = {}
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller (the leader) runs
+    the function, callers arriving while it runs wait and receive the same result or
+    exception. Nothing is kept once the call finishes, so this is not a cache.
+    Followers share the leader's result object and must treat it as read-only.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._leaders = 0
+        self._followers = 0
+        FLIGHTS[name] = self
+
+    def do(self, key, fn, *args, **kwargs):
+        """Return fn(*args, **kwargs), sharing one execution among concurrent callers of key"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self._followers += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self._leaders += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self, key):
+        """True if a call for key is currently running"""
+        with self._lock:
+            return key in self._calls
+
+    def stats(self):
+        with self._lock:
+            total = self._leaders + self._followers
+            return {
+                "in_flight": len(self._calls),
+                "leaders": self._leaders,
+                "followers": self._followers,
+                "shared_rate": round(self._followers / total, 3) if total else 0.0
+            }
+
+
+def singleflight_stats():
+    return {name: flight.stats() for name, flight in FLIGHTS.items()}
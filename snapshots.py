@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+# Precomputed JSON responses refreshed on a timer.
+# A build produces every snapshot at once; each is serialized a single time and
+# served with a content ETag and Last-Modified. If a build fails the previous
+# snapshots stay in place until the next attempt. A build that could only fill part
+# of its payloads raises IncompleteBuild: what it has is published unless it covers
+# less than the current snapshot, and the build is retried like a failure.
+
+
+class IncompleteBuild(Exception):
+    """Raised by a build_fn with the partial payloads ({name: payload}) it managed to build"""
+
+    def __init__(self, payloads, reason):
+        super().__init__(reason)
+        self.payloads = payloads
+
+
+class Snapshot:
+    """Serialized payload plus the validators used for conditional requests"""
+
+    def __init__(self, body, etag, last_modified):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+
+
+class SnapshotRefresher:
+    """
+    Keeps the output of build_fn() ({name: payload}) fresh in the background.
+    coverage_fn(name, payload) measures how much of a payload a build filled
+    (e.g. its number of rows); partial builds never replace a fuller snapshot.
+    """
+
+    def __init__(self, name, build_fn, interval=900, retry_interval=60, coverage_fn=None):
+        self.name = name
+        self.build_fn = build_fn
+        self.interval = interval
+        self.retry_interval = retry_interval
+        self.coverage_fn = coverage_fn
+        self._snapshots = {}
+        self._coverage = {}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._pid = None
+        self._complete = True  # whether the last build succeeded in full; otherwise retry soon
+        self._attempted = time.monotonic()
+        self._stats = {"refreshes": 0, "partial": 0, "failures": 0, "last_refresh": None, "last_error": None}
+
+    def refresh(self):
+        """
+        Rebuild all snapshots. Returns False if the build fails (keeping the old
+        snapshots) or is incomplete (keeping whichever of old and new covers more).
+        """
+        with self._refresh_lock:
+            self._attempted = time.monotonic()
+            complete = True
+            try:
+                payloads = self.build_fn()
+            except IncompleteBuild as e:
+                payloads, complete = e.payloads, False
+                print(f"{self.name}: partial refresh, retrying in {self.retry_interval}s: {e}")
+            except Exception as e:
+                self._complete = False
+                with self._lock:
+                    self._stats["failures"] += 1
+                    self._stats["last_error"] = str(e)
+                print(f"{self.name}: refresh failed, serving previous snapshot: {e}")
+                return False
+
+            now = datetime.now(timezone.utc).replace(microsecond=0)
+            with self._lock:
+                for key, payload in payloads.items():
+                    coverage = self.coverage_fn(key, payload) if self.coverage_fn else 0
+                    if not complete and key in self._snapshots and coverage < self._coverage.get(key, 0):
+                        continue
+                    body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+                    etag = hashlib.sha1(body).hexdigest()
+                    previous = self._snapshots.get(key)
+                    # Unchanged content keeps its validators so clients keep getting 304s
+                    if previous is None or previous.etag != etag:
+                        self._snapshots[key] = Snapshot(body, etag, now)
+                    self._coverage[key] = coverage
+                if complete:
+                    self._stats["refreshes"] += 1
+                    self._stats["last_refresh"] = now.isoformat()
+                    self._stats["last_error"] = None
+                else:
+                    self._stats["partial"] += 1
+            self._complete = complete
+            return complete
+
+    def _ensure_scheduler(self):
+        # Threads do not survive fork: start one scheduler per worker process
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._pid = pid
+                    threading.Thread(target=self._run, name=f"{self.name}-refresher", daemon=True).start()
+
+    def start(self):
+        """
+        Start this process's scheduler without waiting for a request to ask for a
+        snapshot; the first build runs on it right away. No-op if already running.
+        """
+        self._ensure_scheduler()
+
+    def _run(self):
+        # Wakes every retry_interval; rebuilds once the last attempt is interval old,
+        # or retry_interval old if it failed or was incomplete
+        if not self._snapshots:
+            self.refresh()
+        while True:
+            time.sleep(self.retry_interval)
+            due = self.interval if self._complete else self.retry_interval
+            if time.monotonic() - self._attempted >= due:
+                self.refresh()
+
+    def get(self, key):
+        """Current snapshot for key; the first call in a process builds it synchronously"""
+        self._ensure_scheduler()
+        snapshot = self._snapshots.get(key)
+        if snapshot is None:
+            with self._refresh_lock:
+                snapshot = self._snapshots.get(key)
+            if snapshot is None:
+                self.refresh()
+                snapshot = self._snapshots.get(key)
+        return snapshot
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["snapshots"] = {
+                key: {"etag": s.etag, "last_modified": s.last_modified.isoformat(), "bytes": len(s.body)}
+                for key, s in self._snapshots.items()
+            }
+        stats["interval"] = self.interval
+        return stats
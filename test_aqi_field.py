@@ -0,0 +1,106 @@
+import math
+import time
+
+import numpy as np
+import pytest
+
+from aqi_field import AQIField, pairwise_km
+
+
+def test_pairwise_km_matches_a_known_distance():
+    # One degree of latitude is about 111.2 km
+    distance = pairwise_km([0.0, 10.0], [0.0, 0.0], [1.0], [0.0])
+    assert distance.shape == (2, 1)
+    assert distance[0, 0] == pytest.approx(111.2, abs=0.1)
+    assert distance[1, 0] == pytest.approx(9 * 111.2, abs=1)
+
+
+def test_estimate_at_an_anchor_is_its_reading_with_full_confidence():
+    field = AQIField()
+    field.observe(28.6, 77.2, 150)
+    aqi, confidence = field.estimate([28.6], [77.2])
+    assert aqi[0] == pytest.approx(150)
+    assert confidence[0] == pytest.approx(1.0, abs=1e-3)
+
+
+def test_inverse_distance_weighting_favours_the_nearer_anchor():
+    field = AQIField()
+    field.observe(20.0, 75.0, 100)
+    field.observe(20.0, 75.2, 300)
+    lat, lon = 20.0, 75.05
+    aqi, _ = field.estimate([lat], [lon])
+
+    d = pairwise_km([lat], [lon], [20.0, 20.0], [75.0, 75.2])[0]
+    w = 1 / (d ** 2 + 1)
+    assert aqi[0] == pytest.approx((w @ [100, 300]) / w.sum())
+    assert 100 < aqi[0] < 200
+
+
+def test_confidence_falls_off_with_distance_and_age():
+    field = AQIField(length_km=25, half_life=3600)
+    now = time.time()
+    field.observe(20.0, 75.0, 100, observed_at=now)
+    field.observe(30.0, 75.0, 100, observed_at=now - 3600)
+
+    # 0.25 degrees of latitude north of each anchor
+    lats = [20.25, 30.25]
+    _, confidence = field.estimate(lats, [75.0, 75.0])
+    d = pairwise_km([20.25], [75.0], [20.0], [75.0])[0, 0]
+    assert confidence[0] == pytest.approx(math.exp(-d / 25), rel=1e-3)
+    assert confidence[1] == pytest.approx(confidence[0] / 2, rel=1e-3)
+
+
+def test_points_beyond_the_radius_have_no_estimate():
+    field = AQIField(radius_km=50)
+    field.observe(20.0, 75.0, 100)
+    aqi, confidence = field.estimate([21.0], [75.0])
+    assert np.isnan(aqi[0])
+    assert confidence[0] == 0
+
+
+def test_expired_anchors_are_dropped():
+    field = AQIField(max_age=600)
+    field.observe(20.0, 75.0, 100, observed_at=time.time() - 601)
+    aqi, _ = field.estimate([20.0], [75.0])
+    assert np.isnan(aqi[0])
+    assert field.stats()["anchors"] == 0
+
+
+def test_newest_reading_wins_within_a_cell():
+    field = AQIField()
+    now = time.time()
+    field.observe(20.0, 75.0, 100, observed_at=now)
+    field.observe(20.0, 75.0, 300, observed_at=now - 60)
+    assert field.estimate([20.0], [75.0])[0][0] == pytest.approx(100)
+    field.observe(20.0, 75.0, 200, observed_at=now + 1)
+    assert field.estimate([20.0], [75.0])[0][0] == pytest.approx(200)
+
+
+def test_oldest_anchor_is_evicted_past_max_anchors():
+    field = AQIField(max_anchors=3)
+    now = time.time()
+    field.observe(20.0, 75.0, 100, observed_at=now - 10)
+    field.observe(21.0, 75.0, 100, observed_at=now - 30)
+    field.observe(22.0, 75.0, 100, observed_at=now - 20)
+    # Refreshing the oldest anchor's cell makes it the newest
+    field.observe(21.0, 75.0, 100, observed_at=now)
+    field.observe(23.0, 75.0, 100, observed_at=now - 5)
+
+    aqi, _ = field.estimate([20.0, 21.0, 22.0, 23.0], [75.0] * 4)
+    assert field.stats()["anchors"] == 3
+    assert np.isnan(aqi).tolist() == [False, False, True, False]
+
+
+def test_gaps_skips_confident_points_and_points_covered_by_an_earlier_pick():
+    field = AQIField(length_km=25)
+    field.observe(20.0, 75.0, 100)
+    # Coverage at 0.5 confidence is 25 * ln 2, about 17 km, i.e. 0.156 degrees of latitude
+    lats = np.array([20.0, 20.5, 20.6, 20.7, 21.5])
+    lons = np.full(5, 75.0)
+    assert field.gaps(lats, lons, 0.5) == [1, 3, 4]
+
+
+def test_gaps_picks_every_point_without_a_coverage_radius():
+    field = AQIField()
+    assert field.gaps([20.0, 20.0001], [75.0, 75.0], 1.0) == [0, 1]
+    assert field.gaps([], [], 0.5) == []
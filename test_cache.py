@@ -0,0 +1,155 @@
+import os
+
+import pytest
+
+import cache
+from cache import SQLiteCache, ensure_private_dir
+
+
+class FakeClock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    directory = tmp_path / "cache"
+    ensure_private_dir(str(directory))
+    return str(directory)
+
+
+def make(cache_dir, name="test", **kwargs):
+    return SQLiteCache(name, directory=cache_dir, **kwargs)
+
+
+def test_entries_are_shared_between_instances(cache_dir, clock):
+    make(cache_dir).set(("tile", 1), {"aqi": 3})
+    assert make(cache_dir).get(("tile", 1)) == {"aqi": 3}
+
+
+def test_expired_entries_are_served_stale_within_the_window(cache_dir, clock):
+    c = make(cache_dir, ttl=60, stale_ttl=300)
+    c.set("k", "v")
+    assert c.get_stale("k") == ("v", True)
+
+    clock.now += 61
+    assert c.get("k") is None
+    assert c.get_stale("k") == ("v", False)
+    assert not c.contains("k")
+    assert c.contains("k", allow_stale=True)
+
+    clock.now += 300
+    assert c.get_stale("k", "missing") == ("missing", False)
+    assert not c.contains("k", allow_stale=True)
+    stats = c.stats()
+    assert (stats["hits"], stats["stale_hits"], stats["misses"]) == (1, 1, 2)
+
+
+def test_prune_drops_entries_past_the_stale_window_then_the_oldest(cache_dir, clock):
+    c = make(cache_dir, maxsize=3, ttl=60, stale_ttl=30)
+    c.set("expired", 0, ttl=-31)
+    for i in range(5):
+        clock.now += 1
+        c.set(f"k{i}", i)
+    assert len(c) == 6
+
+    c.prune()
+    assert len(c) == 3
+    assert [c.get(f"k{i}") for i in range(5)] == [None, None, 2, 3, 4]
+    assert c.stats()["evictions"] == 2
+
+
+def test_sets_prune_once_the_table_grows_past_maxsize(cache_dir, clock, monkeypatch):
+    monkeypatch.setattr(SQLiteCache, "PRUNE_EVERY", 4)
+    c = make(cache_dir, maxsize=2)
+    for i in range(3):
+        clock.now += 1
+        c.set(i, i)
+    assert len(c) == 3  # may briefly exceed maxsize
+    clock.now += 1
+    c.set(3, 3)
+    assert len(c) == 2
+    assert c.get(3) == 3 and c.get(0) is None
+
+
+def test_set_many_writes_in_one_transaction(cache_dir, clock, monkeypatch):
+    monkeypatch.setattr(SQLiteCache, "PRUNE_EVERY", 64)
+    c = make(cache_dir, maxsize=50)
+    statements = []
+    c._connect().set_trace_callback(statements.append)
+    c.set_many((f"cell{i}", {"speed": i}) for i in range(100))
+    c._connect().set_trace_callback(None)
+
+    assert statements.count("BEGIN") == 1
+    assert statements.count("COMMIT") == 1
+    # Crossing a PRUNE_EVERY boundary prunes back to maxsize
+    assert len(c) == 50
+    assert make(cache_dir).get("cell99") == {"speed": 99}
+
+
+def test_set_many_with_nothing_to_write_is_a_no_op(cache_dir, clock):
+    c = make(cache_dir)
+    c.set_many([])
+    assert len(c) == 0
+
+
+def test_unreadable_entries_are_dropped_as_misses(cache_dir, clock):
+    c = make(cache_dir)
+    c.set("k", "v")
+    c._connect().execute("UPDATE entries SET value = ? WHERE key = ?", (b"not a pickle", repr("k")))
+
+    assert c.get("k", "default") == "default"
+    assert c.stats()["misses"] == 1
+    assert len(c) == 0
+
+
+def test_database_errors_are_misses(cache_dir, clock):
+    c = make(cache_dir)
+    c.set("k", "v")
+    c._connect().execute("DROP TABLE entries")
+    assert c.get("k") is None
+    assert not c.contains("k")
+    c.set("k", "v")  # logged, not raised
+    assert len(c) == 0
+
+
+def test_private_dir_is_created_owner_only(tmp_path):
+    directory = tmp_path / "new"
+    ensure_private_dir(str(directory))
+    assert os.stat(directory).st_mode & 0o777 == 0o700
+
+
+def test_private_dir_readable_by_others_is_narrowed(tmp_path):
+    directory = tmp_path / "readable"
+    directory.mkdir(mode=0o755)
+    os.chmod(directory, 0o755)
+    ensure_private_dir(str(directory))
+    assert os.stat(directory).st_mode & 0o777 == 0o700
+
+
+def test_dir_writable_by_others_is_refused(tmp_path):
+    directory = tmp_path / "shared"
+    directory.mkdir()
+    os.chmod(directory, 0o777)
+    with pytest.raises(RuntimeError, match="CACHE_DIR"):
+        SQLiteCache("test", directory=str(directory))
+    assert not (directory / "test.sqlite").exists()
+
+
+@pytest.mark.skipif(not hasattr(os, "geteuid") or os.geteuid() != 0, reason="needs root to chown")
+def test_dir_owned_by_another_user_is_refused(tmp_path):
+    directory = tmp_path / "theirs"
+    directory.mkdir(mode=0o700)
+    os.chown(directory, 65534, 65534)
+    with pytest.raises(RuntimeError, match="REPORT_DIR"):
+        ensure_private_dir(str(directory), "REPORT_DIR")
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+from exposure import route_exposure, vertex_minutes
+
+# A straight 100 km route with a vertex every 100 m, crossed in two ORS steps
+CUMULATIVE_KM = np.linspace(0, 100, 1001)
+SLOW_THEN_FAST = [
+    {"duration": 3000, "way_points": [0, 500]},
+    {"duration": 600, "way_points": [500, 1000]},
+]
+
+
+def test_steps_spread_each_duration_over_its_own_stretch():
+    minutes = vertex_minutes(CUMULATIVE_KM, SLOW_THEN_FAST)
+    assert minutes[0] == 0
+    assert minutes[250] == pytest.approx(25)
+    assert minutes[500] == pytest.approx(50)
+    assert minutes[750] == pytest.approx(55)
+    assert minutes[-1] == pytest.approx(60)
+    assert np.all(np.diff(minutes) >= 0)
+
+
+def test_without_steps_the_duration_is_spread_evenly_by_distance():
+    even = vertex_minutes(CUMULATIVE_KM, duration_min=60)
+    assert even[250] == pytest.approx(15)
+    assert even[500] == pytest.approx(30)
+    assert even[-1] == pytest.approx(60)
+    # Steps pointing past the geometry are ignored
+    broken = [{"duration": 3600, "way_points": [0, 5000]}]
+    assert np.allclose(vertex_minutes(CUMULATIVE_KM, broken, 60), even)
+    assert not vertex_minutes(CUMULATIVE_KM).any()
+
+
+def test_exposure_is_the_trapezoid_integral_over_time():
+    # AQI rises linearly from 100 to 300 over the second half of the route.
+    # Slow half: 50 min at 100 -> 5000; fast half: 10 min averaging 200 -> 2000
+    result = route_exposure(CUMULATIVE_KM, [0, 50, 100], [100, 100, 300], SLOW_THEN_FAST)
+    assert result["exposure"] == pytest.approx(7000)
+    assert result["minutes"] == pytest.approx(60)
+    assert result["mean_aqi"] == 117
+    assert result["peak_aqi"] == 300
+
+
+def test_time_weighting_moves_the_mean_towards_slow_stretches():
+    samples = ([0, 50, 100], [100, 100, 300])
+    even = route_exposure(CUMULATIVE_KM, *samples, duration_min=60)
+    assert even["exposure"] == pytest.approx(9000)
+    assert even["mean_aqi"] == 150
+
+    fast_then_slow = [
+        {"duration": 600, "way_points": [0, 500]},
+        {"duration": 3000, "way_points": [500, 1000]},
+    ]
+    polluted_slow = route_exposure(CUMULATIVE_KM, *samples, fast_then_slow)
+    assert polluted_slow["exposure"] == pytest.approx(11000)
+    assert polluted_slow["mean_aqi"] == 183
+
+
+def test_p90_is_weighted_by_time_not_by_samples():
+    samples = ([0, 50, 100], [100, 100, 300])
+    # Evenly spread, the top 10% of the time is spent above 260
+    assert route_exposure(CUMULATIVE_KM, *samples, duration_min=60)["p90_aqi"] == 260
+    # Only 10 of the 60 minutes are spent in the rising half, so the worst 6 minutes
+    # cover its last 30 km, from AQI 180 upwards
+    assert route_exposure(CUMULATIVE_KM, *samples, SLOW_THEN_FAST)["p90_aqi"] == 180
+
+
+def test_delay_factor_stretches_time_but_not_the_mean():
+    samples = ([0, 50, 100], [100, 100, 300])
+    free_flow = route_exposure(CUMULATIVE_KM, *samples, SLOW_THEN_FAST)
+    congested = route_exposure(CUMULATIVE_KM, *samples, SLOW_THEN_FAST, delay_factor=1.5)
+    assert congested["minutes"] == pytest.approx(90)
+    assert congested["exposure"] == pytest.approx(1.5 * free_flow["exposure"])
+    assert congested["mean_aqi"] == free_flow["mean_aqi"]
+    assert congested["p90_aqi"] == free_flow["p90_aqi"]
+
+
+def test_zero_duration_falls_back_to_the_sample_mean():
+    result = route_exposure(CUMULATIVE_KM, [0, 100], [100, 200])
+    assert result == {"exposure": 0.0, "minutes": 0.0, "mean_aqi": 150, "peak_aqi": 200, "p90_aqi": 200}
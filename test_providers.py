@@ -0,0 +1,240 @@
+import os
+from datetime import datetime, timezone
+
+import pytest
+import requests
+
+import providers
+from providers import CircuitBreaker, CircuitOpenError, DailyQuota, ProviderClient, RateLimited, TokenBucket
+
+
+class FakeTime:
+    """Stands in for the time module: sleeping only moves the clock"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def perf_counter(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeTime()
+    monkeypatch.setattr(providers, "time", clock)
+    return clock
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class FakeSession:
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def request(self, method, url, **kwargs):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return FakeResponse(outcome)
+
+
+def client_with(session, **kwargs):
+    client = ProviderClient("test", **kwargs)
+    client._session, client._pid = session, os.getpid()
+    return client
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()  # resets the count
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.is_open()
+    assert not breaker.allow()
+
+
+def test_breaker_lets_a_single_probe_through_after_the_reset_timeout(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 29
+    assert not breaker.allow()
+
+    clock.now += 1
+    assert not breaker.is_open()
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    assert not breaker.allow()  # the probe is in flight
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow() and breaker.allow()
+
+
+def test_failed_probe_reopens_the_breaker(clock):
+    breaker = CircuitBreaker("test", failure_threshold=5, reset_timeout=30)
+    for _ in range(5):
+        breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    clock.now += 30
+    assert breaker.allow()
+
+
+def test_released_probe_slot_can_be_taken_again(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_bucket_allows_a_burst_then_refills_at_rate(clock):
+    bucket = TokenBucket(rate=2, burst=3)
+    assert all(bucket.acquire(timeout=0) for _ in range(3))
+    assert not bucket.acquire(timeout=0.4)
+    clock.now += 0.5
+    assert bucket.available() == pytest.approx(1)
+    assert bucket.available(within=1.0) == pytest.approx(3)
+    clock.now += 10
+    assert bucket.available() == pytest.approx(3)  # capped at burst
+
+
+def test_waiters_reserve_tokens_in_arrival_order(clock):
+    bucket = TokenBucket(rate=1, burst=1)
+    assert bucket.acquire()
+    assert clock.slept == []
+
+    # Each waiter takes the next token, so the balance goes negative and later
+    # waiters sleep longer; a caller that cannot wait reserves nothing
+    clock.sleep = lambda seconds: clock.slept.append(seconds)
+    assert bucket.acquire()
+    assert bucket.acquire()
+    assert not bucket.acquire(timeout=2.5)
+    assert bucket.acquire(timeout=3)
+    assert clock.slept == pytest.approx([1, 2, 3])
+    assert bucket._tokens == pytest.approx(-3)
+    assert bucket.available() == 0
+
+
+def test_drain_spends_the_balance(clock):
+    bucket = TokenBucket(rate=1, burst=5)
+    bucket.drain()
+    assert bucket.available() == 0
+    clock.now += 2
+    assert bucket.available() == pytest.approx(2)
+
+
+def test_quota_resets_at_the_utc_day_rollover(monkeypatch):
+    today = [datetime(2024, 5, 1, 23, 59, tzinfo=timezone.utc)]
+
+    class FakeDatetime:
+        @staticmethod
+        def now(tz=None):
+            return today[0]
+
+    monkeypatch.setattr(providers, "datetime", FakeDatetime)
+    quota = DailyQuota(2)
+    assert quota.take() and quota.take()
+    assert not quota.take()
+    assert quota.remaining() == 0
+
+    today[0] = datetime(2024, 5, 2, 0, 0, tzinfo=timezone.utc)
+    assert quota.remaining() == 2
+    assert quota.take()
+    assert quota.remaining() == 1
+
+
+def test_rate_limited_call_releases_the_probe_slot(clock):
+    session = FakeSession(200)
+    client = client_with(session, rate=1, burst=1, failure_threshold=1, reset_timeout=30)
+    client.breaker.record_failure()
+    clock.now += 30
+    client._bucket.drain()
+
+    with pytest.raises(RateLimited):
+        client.get("https://example.test", deadline=clock.now + 0.5)
+    assert session.calls == 0
+    assert client.stats()["rate_limited"] == 1
+    # The probe slot was given back, so the next caller can still probe
+    clock.now += 1
+    assert client.get("https://example.test").status_code == 200
+    assert client.breaker.state == "closed"
+
+
+def test_exhausted_quota_raises_rate_limited(clock):
+    client = client_with(FakeSession(200, 200), daily_quota=1)
+    client.get("https://example.test")
+    with pytest.raises(RateLimited, match="daily quota"):
+        client.get("https://example.test")
+
+
+def test_server_errors_trip_the_breaker_but_throttling_does_not(clock):
+    session = FakeSession(500, 503, 429, 429, 502, requests.ConnectionError("reset"))
+    client = client_with(session, rate=10, burst=10, failure_threshold=2)
+
+    assert client.get("https://example.test").status_code == 500
+    assert client.get("https://example.test").status_code == 503
+    assert client.breaker.state == "open"
+    clock.now += 30
+
+    # A 429 is a healthy probe, but it drains the bucket so we back off
+    assert client.get("https://example.test").status_code == 429
+    assert client.breaker.state == "closed"
+    assert client._bucket.available() == 0
+    clock.now += 1
+    assert client.get("https://example.test").status_code == 429
+    assert client.breaker.state == "closed"
+
+    # Network errors count like 5xx responses
+    clock.now += 1
+    assert client.get("https://example.test").status_code == 502
+    assert client.breaker.state == "closed"
+    with pytest.raises(requests.ConnectionError):
+        client.get("https://example.test")
+    assert client.breaker.state == "open"
+    stats = client.stats()
+    assert stats["errors"] == 4
+    assert stats["status_codes"] == {"500": 1, "503": 1, "429": 2, "502": 1}
+
+
+def test_open_circuit_short_circuits_without_a_request(clock):
+    session = FakeSession()
+    client = client_with(session, failure_threshold=1)
+    client.breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        client.get("https://example.test")
+    assert session.calls == 0
+    assert client.stats()["short_circuited"] == 1
+
+
+def test_capacity_is_zero_while_the_circuit_is_open(clock):
+    client = client_with(FakeSession(), rate=2, burst=4, daily_quota=3, failure_threshold=1, reset_timeout=30)
+    assert client.capacity() == 3  # the quota is tighter than the bucket
+    assert client_with(FakeSession()).capacity() == float("inf")
+
+    client.breaker.record_failure()
+    assert client.capacity() == 0
+    clock.now += 30
+    assert client.capacity() == 3  # due for a probe
@@ -0,0 +1,105 @@
+import concurrent.futures
+import threading
+import time
+
+import pytest
+
+from sampling import SamplingPlan
+
+
+@pytest.fixture(scope="module")
+def executor():
+    pool = concurrent.futures.ThreadPoolExecutor(max_workers=8)
+    yield pool
+    pool.shutdown(wait=False)
+
+
+def points(*coords):
+    return [{"lat": lat, "lon": lon} for lat, lon in coords]
+
+
+def recording_lookup():
+    calls = []
+    lock = threading.Lock()
+
+    def lookup(lat, lon, deadline=None):
+        with lock:
+            calls.append((lat, lon))
+        return round(lat * 100 + lon)
+
+    return lookup, calls
+
+
+def test_shared_cells_are_looked_up_once_and_scattered_to_every_route(executor):
+    plan = SamplingPlan("test", precision=5)
+    shared = [(28.6, 77.2), (28.0, 77.0)]
+    plan.add_route(points(*shared, (27.5, 76.5)))
+    plan.add_route(points(*shared, (27.4, 77.6)))
+    lookup, calls = recording_lookup()
+
+    assert plan.fetch(lookup, executor) == 4
+    assert len(calls) == 4
+    assert plan.values(0)[:2] == plan.values(1)[:2] == [2937, 2877]
+    assert plan.values(0)[2] == round(27.5 * 100 + 76.5)
+    assert plan.values(1)[2] == round(27.4 * 100 + 77.6)
+    assert plan.stats() == {"routes": 2, "points": 6, "cells": 4, "fetched": 4}
+
+
+def test_points_in_the_same_cell_share_the_first_points_reading(executor):
+    plan = SamplingPlan("test", precision=5)
+    plan.add_route(points((28.60000, 77.20000), (28.60001, 77.20001)))
+    lookup, calls = recording_lookup()
+    plan.fetch(lookup, executor)
+    assert calls == [(28.6, 77.2)]
+    assert plan.values(0) == [2937, 2937]
+
+
+def test_budget_is_split_evenly_between_routes():
+    plan = SamplingPlan("test", precision=6)
+    plan.add_route(points(*[(20.0 + i * 0.1, 75.0) for i in range(10)]))
+    plan.add_route(points(*[(20.0 + i * 0.1, 80.0) for i in range(10)]))
+    selected = plan.select(budget=6)
+    assert len(selected) == 6
+    # Each route keeps its first and last point
+    first_route = plan._routes[0]
+    assert first_route[0] in selected and first_route[-1] in selected
+
+
+def test_cached_cells_do_not_count_against_the_budget(executor):
+    plan = SamplingPlan("test", precision=6)
+    plan.add_route(points(*[(20.0 + i * 0.1, 75.0) for i in range(10)]))
+    lookup, calls = recording_lookup()
+
+    assert plan.fetch(lookup, executor, budget=0) == 0
+    cached = lambda lat, lon: lat < 20.45
+    assert plan.fetch(lookup, executor, budget=0, cached=cached) == 5
+    assert sorted(lat for lat, _ in calls) == pytest.approx([20.0, 20.1, 20.2, 20.3, 20.4])
+    assert plan.fetch(lookup, executor, budget=2, cached=cached) == 7
+
+
+def test_missing_readings_come_back_as_none(executor):
+    plan = SamplingPlan("test", precision=5)
+    plan.add_route(points((10.0, 70.0), (12.0, 72.0), (14.0, 74.0)))
+
+    def flaky(lat, lon, deadline=None):
+        if lat == 12.0:
+            raise RuntimeError("upstream error")
+        return None if lat == 14.0 else 42
+
+    plan.fetch(flaky, executor)
+    assert plan.values(0) == [42, None, None]
+
+
+def test_lookups_still_running_at_the_deadline_are_left_out(executor):
+    plan = SamplingPlan("test", precision=5)
+    plan.add_route(points((10.0, 70.0), (12.0, 72.0)))
+
+    def slow(lat, lon, deadline=None):
+        if lat == 12.0:
+            time.sleep(0.5)
+        return lat
+
+    started = time.monotonic()
+    plan.fetch(slow, executor, deadline=time.monotonic() + 0.1)
+    assert time.monotonic() - started < 0.4
+    assert plan.values(0) == [10.0, None]
@@ -0,0 +1,93 @@
+import threading
+import time
+
+import pytest
+
+from singleflight import SingleFlight, singleflight_stats
+
+
+def test_concurrent_callers_share_one_execution():
+    flight = SingleFlight("test-shared")
+    calls = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow(value):
+        calls.append(value)
+        started.set()
+        release.wait(2)
+        return {"value": value}
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do("k", slow, 1)))
+    leader.start()
+    started.wait(2)
+    assert flight.in_flight("k")
+
+    followers = [threading.Thread(target=lambda: results.append(flight.do("k", slow, 2))) for _ in range(4)]
+    for t in followers:
+        t.start()
+    time.sleep(0.05)
+    release.set()
+    for t in [leader, *followers]:
+        t.join(2)
+
+    assert calls == [1]
+    assert len(results) == 5
+    assert all(r is results[0] for r in results)
+    stats = flight.stats()
+    assert stats["leaders"] == 1
+    assert stats["followers"] == 4
+    assert stats["in_flight"] == 0
+    assert not flight.in_flight("k")
+
+
+def test_followers_receive_the_leaders_exception():
+    flight = SingleFlight("test-error")
+    started = threading.Event()
+    release = threading.Event()
+
+    def failing():
+        started.set()
+        release.wait(2)
+        raise ValueError("upstream down")
+
+    errors = []
+
+    def call():
+        try:
+            flight.do("k", failing)
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call)]
+    threads[0].start()
+    started.wait(2)
+    threads += [threading.Thread(target=call) for _ in range(2)]
+    for t in threads[1:]:
+        t.start()
+    time.sleep(0.05)
+    release.set()
+    for t in threads:
+        t.join(2)
+
+    assert len(errors) == 3
+    assert all(e is errors[0] for e in errors)
+
+
+def test_nothing_is_kept_after_the_call():
+    flight = SingleFlight("test-no-cache")
+    counter = iter(range(10))
+    assert flight.do("k", lambda: next(counter)) == 0
+    assert flight.do("k", lambda: next(counter)) == 1
+    with pytest.raises(KeyError):
+        flight.do("k", lambda: {}["missing"])
+    assert flight.do("k", lambda: next(counter)) == 2
+
+
+def test_distinct_keys_run_independently_and_are_registered():
+    flight = SingleFlight("test-keys")
+    assert flight.do("a", lambda: "a") == "a"
+    assert flight.do("b", lambda: "b") == "b"
+    assert flight.stats()["followers"] == 0
+    assert singleflight_stats()["test-keys"]["leaders"] == 2
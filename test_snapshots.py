@@ -0,0 +1,67 @@
+import json
+import threading
+
+from snapshots import IncompleteBuild, SnapshotRefresher
+
+
+def rows_refresher(builds):
+    """Refresher whose successive builds return the given (rows, complete) pairs"""
+    builds = iter(builds)
+
+    def build():
+        rows, complete = next(builds)
+        payloads = {"rows": rows}
+        if not complete:
+            raise IncompleteBuild(payloads, "partial")
+        return payloads
+
+    return SnapshotRefresher("test", build, coverage_fn=lambda key, payload: len(payload))
+
+
+def served(refresher):
+    return json.loads(refresher._snapshots["rows"].body)
+
+
+def test_partial_build_is_served_but_reported_incomplete():
+    refresher = rows_refresher([([1, 2], False)])
+    assert refresher.refresh() is False
+    assert served(refresher) == [1, 2]
+    assert refresher.stats()["partial"] == 1
+    assert refresher.stats()["refreshes"] == 0
+
+
+def test_partial_build_never_replaces_a_fuller_snapshot():
+    refresher = rows_refresher([([1, 2, 3], True), ([4], False), ([5, 6, 7], False), ([8], True)])
+    assert refresher.refresh() is True
+    refresher.refresh()
+    assert served(refresher) == [1, 2, 3]
+    refresher.refresh()
+    assert served(refresher) == [5, 6, 7]
+    # A complete build always wins
+    assert refresher.refresh() is True
+    assert served(refresher) == [8]
+
+
+def test_failed_build_keeps_the_previous_snapshot():
+    def build():
+        raise RuntimeError("upstream down")
+
+    refresher = rows_refresher([([1], True)])
+    refresher.refresh()
+    refresher.build_fn = build
+    assert refresher.refresh() is False
+    assert served(refresher) == [1]
+    assert refresher.stats()["last_error"] == "upstream down"
+
+
+def test_start_builds_in_the_background_without_a_request():
+    built = threading.Event()
+
+    def build():
+        built.set()
+        return {"rows": [1]}
+
+    refresher = SnapshotRefresher("test-start", build, retry_interval=60)
+    refresher.start()
+    assert built.wait(2)
+    refresher.start()  # already running in this process
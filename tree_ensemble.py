@@ -0,0 +1,149 @@
+import json
+
+import numpy as np
+
+# Compact inference engine for the XGBoost model in route_model.json.
+# The trees are compiled into flat NumPy arrays and a whole batch is evaluated
+# with vectorized traversal, so serving never imports xgboost, pandas or sklearn.
+
+
+def _parse_base_score(value, num_class):
+    # XGBoost < 2.0 stores a scalar ("5E-1"); newer versions may store "[a,b,c]"
+    value = str(value).strip()
+    if value.startswith("["):
+        scores = [float(v) for v in value.strip("[]").split(",") if v.strip()]
+        if len(scores) == num_class:
+            return np.array(scores, dtype=np.float32)
+        value = scores[0] if scores else 0.0
+    return np.full(num_class, float(value), dtype=np.float32)
+
+
+class TreeEnsemble:
+    """
+    Multi-class gradient-boosted tree ensemble stored as flat arrays.
+    Node arrays cover every tree back to back; leaves point to themselves
+    so traversal can run a fixed number of steps for all trees at once.
+    """
+
+    def __init__(self, feature, threshold, left, right, default_left, value,
+                 roots, tree_class, base_score, max_depth, feature_names=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.default_left = default_left
+        self.value = value
+        self.roots = roots
+        self.tree_class = tree_class
+        self.base_score = base_score
+        self.max_depth = int(max_depth)
+        self.feature_names = list(feature_names or [])
+        self.num_class = len(base_score)
+        # (num_trees, num_class) one-hot used to sum leaf values per class
+        self._class_matrix = np.eye(self.num_class, dtype=np.float32)[tree_class]
+
+    @classmethod
+    def from_xgboost_json(cls, path):
+        """Compile a model saved with XGBClassifier.save_model(<file>.json)"""
+        with open(path, encoding="utf-8") as f:
+            model = json.load(f)
+        return cls.from_xgboost_dict(model)
+
+    @classmethod
+    def from_xgboost_dict(cls, model):
+        learner = model["learner"]
+        trees = learner["gradient_booster"]["model"]["trees"]
+        tree_info = learner["gradient_booster"]["model"]["tree_info"]
+        num_class = max(int(learner["learner_model_param"].get("num_class", "0")), 1)
+
+        features, thresholds, lefts, rights, defaults, values, roots, depths = [], [], [], [], [], [], [], []
+        offset = 0
+        for tree in trees:
+            left = np.array(tree["left_children"], dtype=np.int64)
+            right = np.array(tree["right_children"], dtype=np.int64)
+            n = len(left)
+            local = np.arange(n)
+            is_leaf = left == -1
+
+            features.append(np.where(is_leaf, 0, tree["split_indices"]))
+            thresholds.append(np.array(tree["split_conditions"], dtype=np.float32))
+            # Leaves loop back to themselves; internal nodes get global child indices
+            lefts.append(np.where(is_leaf, local, left) + offset)
+            rights.append(np.where(is_leaf, local, right) + offset)
+            defaults.append(np.array(tree["default_left"], dtype=bool))
+            # For leaf nodes XGBoost stores the leaf weight in split_conditions
+            values.append(np.where(is_leaf, np.array(tree["split_conditions"], dtype=np.float32), 0.0))
+            roots.append(offset)
+            depths.append(cls._tree_depth(left, right))
+            offset += n
+
+        return cls(
+            feature=np.concatenate(features).astype(np.int64),
+            threshold=np.concatenate(thresholds).astype(np.float32),
+            left=np.concatenate(lefts),
+            right=np.concatenate(rights),
+            default_left=np.concatenate(defaults),
+            value=np.concatenate(values).astype(np.float32),
+            roots=np.array(roots, dtype=np.int64),
+            tree_class=np.array(tree_info, dtype=np.int64),
+            base_score=_parse_base_score(learner["learner_model_param"].get("base_score", 0.5), num_class),
+            max_depth=max(depths) if depths else 0,
+            feature_names=learner.get("feature_names")
+        )
+
+    _ARRAYS = ("feature", "threshold", "left", "right", "default_left", "value", "roots", "tree_class", "base_score")
+
+    def save(self, path):
+        """Write the compiled arrays as an uncompressed .npz (loads without any JSON parsing)"""
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                max_depth=np.array(self.max_depth),
+                feature_names=np.array(self.feature_names, dtype=str),
+                **{name: getattr(self, name) for name in self._ARRAYS}
+            )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                max_depth=int(data["max_depth"]),
+                feature_names=[str(name) for name in data["feature_names"]],
+                **{name: data[name] for name in cls._ARRAYS}
+            )
+
+    @staticmethod
+    def _tree_depth(left, right):
+        depth = 0
+        level = [0]
+        while level:
+            level = [c for node in level for c in (left[node], right[node]) if c != -1]
+            if level:
+                depth += 1
+        return depth
+
+    def predict_margin(self, X):
+        """Raw per-class scores (before softmax) for a 2D feature array"""
+        # XGBoost compares features as float32 against float32 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[None, :]
+        rows = np.arange(len(X))[:, None]
+        node = np.broadcast_to(self.roots, (len(X), len(self.roots)))
+
+        for _ in range(self.max_depth):
+            x = X[rows, self.feature[node]]
+            go_left = np.where(np.isnan(x), self.default_left[node], x < self.threshold[node])
+            node = np.where(go_left, self.left[node], self.right[node])
+
+        return self.value[node] @ self._class_matrix + self.base_score
+
+    def predict_proba(self, X):
+        """Class probabilities, matching XGBClassifier.predict_proba"""
+        margin = self.predict_margin(X).astype(np.float64)
+        margin -= margin.max(axis=1, keepdims=True)
+        exp = np.exp(margin)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def predict(self, X):
+        return self.predict_proba(X).argmax(axis=1)